@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import convert_flac_mp3
+import instrumentation
+from cover_art import CoverCache
+from cuesheet import cuesheet_to_info, read_cue_file
+from output_profiles import PROFILES
+
+DEFAULT_JOBS = os.cpu_count() or 1
+SAMPLE_RATE = 44100
+SCENARIOS = ("cue", "cue-single-decode", "cue-gapless", "cue-flac", "folder")
+STAGES = ("probe", "encode", "tag")
+STAGE_OF_EVENT = {
+    "metadata": "probe",
+    "ffprobe": "probe",
+    "cover": "probe",
+    "ffmpeg": "encode",
+    "tag": "tag",
+}
+
+
+def synth_flac(output_path: Path, seconds: float, tags: dict | None = None) -> None:
+    """Render pink noise to a stereo 16-bit FLAC (noise keeps LAME busy)."""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i"]
+    cmd.append(f"anoisesrc=color=pink:amplitude=0.3:sample_rate={SAMPLE_RATE}")
+    cmd += ["-t", str(seconds), "-ac", "2", "-sample_fmt", "s16", "-c:a", "flac"]
+    for key, value in (tags or {}).items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd.append(str(output_path))
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+
+
+def synth_cover(output_path: Path) -> None:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=size=600x600",
+            "-frames:v",
+            "1",
+            str(output_path),
+        ],
+        check=True,
+        stdin=subprocess.DEVNULL,
+    )
+
+
+def cue_timestamp(seconds: int) -> str:
+    return f"{seconds // 60:02d}:{seconds % 60:02d}:00"
+
+
+def make_cue_album(album_dir: Path, tracks: int, track_seconds: int) -> tuple:
+    """Single FLAC image plus .cue, info.json and folder.jpg.
+
+    Returns (info_path, flac_path). Existing albums are reused.
+    """
+    flac_path = album_dir / "image.flac"
+    info_path = album_dir / "info.json"
+    if info_path.exists() and flac_path.exists():
+        return info_path, flac_path
+
+    album_dir.mkdir(parents=True, exist_ok=True)
+    lines = [
+        'REM GENRE "Benchmark"',
+        "REM DATE 2024",
+        'PERFORMER "Synthetic Artist"',
+        'TITLE "Synthetic Image Album"',
+        'FILE "image.flac" WAVE',
+    ]
+    for n in range(tracks):
+        lines += [
+            f"  TRACK {n + 1:02d} AUDIO",
+            f'    TITLE "Noise Track {n + 1}"',
+            f"    INDEX 01 {cue_timestamp(n * track_seconds)}",
+        ]
+    cue_path = album_dir / "image.cue"
+    cue_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    synth_flac(flac_path, tracks * track_seconds)
+    synth_cover(album_dir / "folder.jpg")
+    info = cuesheet_to_info(read_cue_file(cue_path))
+    with info_path.open("w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2, ensure_ascii=False)
+    return info_path, flac_path
+
+
+def make_folder_library(
+    base_dir: Path, albums: int, tracks: int, track_seconds: int
+) -> Path:
+    """``albums`` directories of tagged per-track FLACs plus a default
+    info.json. Returns the info.json path. Existing files are reused."""
+    info_path = base_dir / "info.json"
+    for a in range(albums):
+        album_dir = base_dir / f"Album {a + 1:02d}"
+        album_dir.mkdir(parents=True, exist_ok=True)
+        for n in range(tracks):
+            flac_path = album_dir / f"{n + 1:02d}.flac"
+            if flac_path.exists():
+                continue
+            synth_flac(
+                flac_path,
+                track_seconds,
+                {
+                    "title": f"Noise Track {n + 1}",
+                    "artist": "Synthetic Artist",
+                    "album": f"Synthetic Album {a + 1}",
+                    "album_artist": "Synthetic Artist",
+                    "track": n + 1,
+                    "genre": "Benchmark",
+                    "date": "2024",
+                },
+            )
+        if not (album_dir / "folder.jpg").exists():
+            synth_cover(album_dir / "folder.jpg")
+    if not info_path.exists():
+        info_path.write_text(
+            json.dumps({"artist": "Synthetic Artist", "genre": "Benchmark"}),
+            encoding="utf-8",
+        )
+    return info_path
+
+
+def stage_totals(events: list[dict]) -> tuple[dict, dict]:
+    """Fold instrumentation events into (seconds, calls) per benchmark stage.
+
+    Times are summed over worker threads, not wall time: probe = FLAC
+    metadata reads, ffprobe and cover loading, encode = ffmpeg, tag = eyed3.
+    """
+    seconds = dict.fromkeys(STAGES, 0.0)
+    calls = dict.fromkeys(STAGES, 0)
+    for event in events:
+        stage = STAGE_OF_EVENT.get(event["stage"])
+        if stage:
+            seconds[stage] += event["duration"]
+            calls[stage] += 1
+    return {k: round(v, 3) for k, v in seconds.items()}, calls
+
+
+def run_scenario(scenario: str, work_dir: Path, options: dict) -> dict:
+    """Run one conversion end to end. Meant to run in a fresh child process
+    so peak RSS and the recorded events belong to this scenario only."""
+    instrumentation.configure()
+    cover_cache = CoverCache()
+
+    if scenario == "folder":
+        base_dir = work_dir / "folder"
+        info_path = make_folder_library(
+            base_dir, options["albums"], options["tracks"], options["track_seconds"]
+        )
+        tracks = options["albums"] * options["tracks"]
+        shutil.rmtree(base_dir / "output_mp3", ignore_errors=True)
+        convert = lambda: convert_flac_mp3.convert_flac_folder(
+            info_path, base_dir, options["jobs"], True, cover_cache
+        )
+    else:
+        album_dir = work_dir / "cue"
+        info_path, flac_path = make_cue_album(
+            album_dir, options["tracks"], options["track_seconds"]
+        )
+        tracks = options["tracks"]
+        run_dir = work_dir / f"run-{scenario}"
+        shutil.rmtree(run_dir, ignore_errors=True)
+        run_dir.mkdir(parents=True)
+        # convert_cue_flac writes to ./output_<format>
+        os.chdir(run_dir)
+        convert = lambda: convert_flac_mp3.convert_cue_flac(
+            info_path.resolve(),
+            flac_path.resolve(),
+            options["jobs"],
+            scenario == "cue-single-decode",
+            True,
+            cover_cache,
+            scenario == "cue-gapless",
+            [PROFILES["flac"]] if scenario == "cue-flac" else None,
+        )
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        failed = convert()
+        wall = time.perf_counter() - start
+
+    audio_seconds = tracks * options["track_seconds"]
+    stage_seconds, stage_calls = stage_totals(instrumentation.RECORDER.events)
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {
+        "scenario": scenario,
+        "jobs": options["jobs"],
+        "tracks": tracks,
+        "failed_tracks": failed,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": round(wall, 3),
+        "tracks_per_second": round(tracks / wall, 3),
+        "audio_seconds_per_wall_second": round(audio_seconds / wall, 2),
+        "peak_rss_kb": self_usage.ru_maxrss,
+        "peak_child_rss_kb": children_usage.ru_maxrss,
+        "stage_seconds": stage_seconds,
+        "stage_calls": stage_calls,
+    }
+    if failed:
+        # Failed tracks finish early, so the throughput would look too good
+        result["error"] = f"{failed} of {tracks} tracks failed"
+    return result
+
+
+def compare(results: list[dict], baseline_path: Path, tolerance: float) -> int:
+    """Print throughput changes against a previous report; returns the number
+    of scenarios that got slower by more than ``tolerance``."""
+    with baseline_path.open("r", encoding="utf-8") as f:
+        baseline = {
+            (r["scenario"], r["jobs"]): r for r in json.load(f).get("results", [])
+        }
+
+    regressions = 0
+    for result in results:
+        old = baseline.get((result["scenario"], result["jobs"]))
+        if not old or "error" in old or "error" in result:
+            continue
+        before = old["audio_seconds_per_wall_second"]
+        after = result["audio_seconds_per_wall_second"]
+        change = (after - before) / before if before else 0.0
+        marker = "✅"
+        if change < -tolerance:
+            regressions += 1
+            marker = "❌"
+        print(
+            f"{marker} {result['scenario']} (jobs={result['jobs']}): "
+            f"{before}x → {after}x realtime ({change:+.1%})"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark convert_flac_mp3 on synthetic FLAC albums."
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=Path("benchmark_work"),
+        help="Folder for the generated albums and outputs (reused between runs)",
+    )
+    parser.add_argument("--report", type=Path, default=Path("benchmark_report.json"))
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})",
+    )
+    parser.add_argument("--albums", type=int, default=2, help="Albums in folder layout")
+    parser.add_argument("--tracks", type=int, default=8, help="Tracks per album")
+    parser.add_argument(
+        "--track-seconds", type=int, default=30, help="Length of each track"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=str(DEFAULT_JOBS),
+        help=f"Comma-separated worker counts to try (default: {DEFAULT_JOBS})",
+    )
+    parser.add_argument(
+        "--compare", type=Path, help="Previous report to check for regressions"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed throughput drop against --compare (default: 0.1 = 10%%)",
+    )
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    work_dir = args.work_dir.resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+    # Generate the inputs up front so it does not count towards any scenario
+    print("🎧 Preparing synthetic albums")
+    if any(s != "folder" for s in scenarios):
+        make_cue_album(work_dir / "cue", args.tracks, args.track_seconds)
+    if "folder" in scenarios:
+        make_folder_library(
+            work_dir / "folder", args.albums, args.tracks, args.track_seconds
+        )
+
+    results = []
+    for jobs in [int(j) for j in args.jobs.split(",") if j.strip()]:
+        options = {
+            "albums": args.albums,
+            "tracks": args.tracks,
+            "track_seconds": args.track_seconds,
+            "jobs": jobs,
+        }
+        for scenario in scenarios:
+            print(f"🎧 {scenario} (jobs={jobs})")
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("fork")
+            ) as pool:
+                try:
+                    result = pool.submit(
+                        run_scenario, scenario, work_dir, options
+                    ).result()
+                except Exception as e:
+                    print(f"❌ Failed: {scenario} ({e})")
+                    results.append(
+                        {"scenario": scenario, "jobs": jobs, "error": str(e)}
+                    )
+                    continue
+            results.append(result)
+            if "error" in result:
+                print(f"❌ Failed: {scenario} ({result['error']})")
+                continue
+            stages = ", ".join(f"{k} {v}s" for k, v in result["stage_seconds"].items())
+            print(
+                f"✅ {result['tracks_per_second']} tracks/s, "
+                f"{result['audio_seconds_per_wall_second']}x realtime, "
+                f"peak RSS {result['peak_rss_kb'] // 1024} MB ({stages})"
+            )
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": {
+            "hostname": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with args.report.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Report written to {args.report}")
+
+    errors = sum(1 for r in results if "error" in r)
+    if errors:
+        print(f"⚠️  {errors} scenario run(s) failed.")
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else 0
+    if errors or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
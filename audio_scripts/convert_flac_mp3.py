@@ -1,56 +1,169 @@
 import argparse
+import os
 import subprocess
 import eyed3
 import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
 from slugify import slugify
 import re
 from titlecase import titlecase
 
+import instrumentation
+import job_queue
+from cover_art import CoverArt, CoverCache
+from flac_meta import FlacFormatError, read_flac_metadata, read_tags, skip_id3v2
+from manifest import ConversionManifest
+from output_profiles import DEFAULT_PROFILES, PROFILES, OutputProfile, parse_profiles
+
+DEFAULT_JOBS = os.cpu_count() or 1
+# mpg123-style decoder delay that iTunSMPB adds on top of LAME's encoder delay
+DECODER_DELAY = 529
+MPEG1_SAMPLE_RATES = (44100, 48000, 32000)
+# The Xing/Info frame is the first frame; this covers its largest size
+XING_SEARCH_BYTES = 4096
+
 
 def cue_index_to_seconds(index_str):
     mm, ss, ff = map(int, index_str.split(":"))
     return mm * 60 + ss + ff / 75.0
 
 
-def find_cover_for_file(path: Path) -> Path | None:
-    for name in ["folder.jpg", "cover.jpg", "Folder.jpg", "Cover.jpg"]:
-        candidate = path.parent / name if path.is_file() else path / name
-        if candidate.exists():
-            return candidate
-    return None
+def seconds_to_samples(seconds: float, sample_rate: int) -> int:
+    return round(seconds * sample_rate)
 
 
 def get_metadata_from_flac(file_path: Path) -> dict:
-    result = subprocess.run(
+    tags = read_tags(file_path)
+
+    return {
+        "title": tags.get("title"),
+        "artist": tags.get("artist"),
+        "album": tags.get("album"),
+        "album_artist": tags.get("album_artist"),
+        "track": int(tags.get("track", "0").split("/")[0]) if "track" in tags else None,
+        "genre": tags.get("genre"),
+        "year": tags.get("date") or tags.get("year"),
+    }
+
+
+def get_metadata_batch(files, max_workers: int = DEFAULT_JOBS) -> list[dict]:
+    """Read metadata for many files concurrently, preserving input order."""
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return list(pool.map(get_metadata_from_flac, files))
+
+
+def get_sample_rate(file_path: Path) -> int:
+    try:
+        sample_rate = read_flac_metadata(file_path)["streaminfo"].get("sample_rate")
+        if sample_rate:
+            return sample_rate
+    except (OSError, FlacFormatError):
+        pass
+
+    result = instrumentation.run(
+        "ffprobe",
         [
             "ffprobe",
             "-v",
             "error",
+            "-select_streams",
+            "a:0",
             "-show_entries",
-            "format_tags",
+            "stream=sample_rate",
             "-of",
             "json",
             str(file_path),
         ],
+        file_path,
         capture_output=True,
         text=True,
+        check=True,
     )
-    data = json.loads(result.stdout)
-    tags = {k.lower(): v for k, v in data.get("format", {}).get("tags", {}).items()}
-
+    streams = json.loads(result.stdout).get("streams", [])
+    return int(streams[0]["sample_rate"]) if streams else 44100
+
+
+def read_lame_info(mp3_path: Path) -> dict | None:
+    """Frame count, sample rate and encoder delay/padding from the Xing/Info
+    frame at the start of an MP3, or None if it has no such frame.
+
+    The delay/padding field sits at the same place whatever encoder wrote the
+    tag, so this also works for ffmpeg's "Lavc"/"Lavf" Info frames, which
+    eyed3 only parses when the encoder string says "LAME".
+    """
+    with open(mp3_path, "rb") as f:
+        skip_id3v2(f)
+        data = f.read(XING_SEARCH_BYTES)
+
+    pos = 0
+    while True:
+        pos = data.find(b"\xff", pos)
+        if pos < 0 or pos + 4 > len(data):
+            return None
+        if data[pos + 1] & 0xE0 == 0xE0 and (data[pos + 1] >> 1) & 0x3 == 1:
+            break
+        pos += 1
+
+    version = (data[pos + 1] >> 3) & 0x3  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    rate_index = (data[pos + 2] >> 2) & 0x3
+    mono = data[pos + 3] >> 6 == 3
+    if version == 1 or rate_index == 3:
+        return None
+    sample_rate = MPEG1_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version]
+    if version == 3:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+
+    xing = pos + 4 + side_info
+    if data[xing : xing + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = int.from_bytes(data[xing + 4 : xing + 8], "big")
+    if not flags & 0x1:
+        return None
+    frames = int.from_bytes(data[xing + 8 : xing + 12], "big")
+    # Skip the byte count, TOC and quality fields that are present
+    lame = xing + 12 + (4 if flags & 0x2 else 0) + (100 if flags & 0x4 else 0)
+    lame += 4 if flags & 0x8 else 0
+    # 9-byte encoder string, revision, lowpass, replay gain (8), flags, bitrate
+    field = data[lame + 21 : lame + 24]
+    if len(field) < 3:
+        return None
+    packed = int.from_bytes(field, "big")
     return {
-        "title": tags.get("title"),
-        "artist": tags.get("artist"),
-        "album": tags.get("album"),
-        "album_artist": tags.get("album_artist"),
-        "track": int(tags.get("track", "0").split("/")[0]) if "track" in tags else None,
-        "genre": tags.get("genre"),
-        "year": tags.get("date") or tags.get("year"),
+        "frames": frames,
+        "sample_rate": sample_rate,
+        "encoder_delay": packed >> 12,
+        "encoder_padding": packed & 0xFFF,
     }
 
 
-def tag_mp3(mp3_path, tag_info, cover_path=None):
+def itunsmpb_from_lame(lame: dict | None) -> str | None:
+    """Build an iTunSMPB value from the Xing/Info header of an encoded MP3
+    (see ``read_lame_info``).
+
+    Players that ignore the LAME tag (iTunes, many phones) use this comment
+    to trim encoder delay and padding for gapless playback.
+    """
+    if not lame or not lame["frames"]:
+        return None
+
+    samples_per_frame = 1152 if lame["sample_rate"] >= 32000 else 576
+    decoded = lame["frames"] * samples_per_frame
+    # The source length does not depend on how the decoder delay is split
+    total = decoded - lame["encoder_delay"] - lame["encoder_padding"]
+    delay = lame["encoder_delay"] + DECODER_DELAY
+    padding = max(decoded - delay - total, 0)
+    fields = [0, delay, padding, total] + [0] * 8
+    return " " + " ".join(
+        f"{v:016X}" if i == 3 else f"{v:08X}" for i, v in enumerate(fields)
+    )
+
+
+def tag_mp3(mp3_path, tag_info, cover: CoverArt | None = None):
     audiofile = eyed3.load(str(mp3_path))
     if not audiofile or not audiofile.tag:
         audiofile.initTag()
@@ -69,132 +182,706 @@ def tag_mp3(mp3_path, tag_info, cover_path=None):
         if match:
             tag.recording_date = eyed3.core.Date(int(match.group(1)))
 
-    if cover_path and cover_path.exists():
-        with open(cover_path, "rb") as img:
-            tag.images.set(
-                eyed3.id3.frames.ImageFrame.FRONT_COVER,
-                img.read(),
-                "image/jpeg",
-                "Cover (front)",
-            )
+    if cover:
+        tag.images.set(
+            eyed3.id3.frames.ImageFrame.FRONT_COVER,
+            cover.data,
+            cover.mime,
+            "Cover (front)",
+        )
+
+    if tag_info.get("gapless"):
+        itunsmpb = itunsmpb_from_lame(read_lame_info(mp3_path))
+        if itunsmpb:
+            tag.comments.set(itunsmpb, "iTunSMPB")
 
     tag.save(version=eyed3.id3.ID3_V2_3)
 
 
-def convert_cue_flac(info_path: Path, flac_file: Path):
+def ffmpeg_tag_args(
+    tag_info,
+    cover: CoverArt | None = None,
+    audio="0:a",
+    profile: OutputProfile = PROFILES["mp3"],
+) -> list[str]:
+    """Output options that make ffmpeg write the tag while encoding, with the
+    same fields ``tag_mp3`` sets (ID3v2.3 for MP3), so each file is written
+    only once.
+
+    The cover is expected as input 1 (piped on stdin); ``audio`` is the
+    stream or filter label to encode. Without a cover ffmpeg's default
+    stream selection is kept, as in a plain encode, except for containers
+    that cannot hold a picture.
+    """
+    args = []
+    if cover and profile.cover:
+        args += ["-map", audio, "-map", "1:v", "-c:v", "copy"]
+        args += ["-disposition:v", "attached_pic"]
+        # The mp3 and flac muxers take the picture description from "title"
+        # and the picture type from "comment"
+        args += ["-metadata:s:v", "title=Cover (front)"]
+        args += ["-metadata:s:v", "comment=Cover (front)"]
+    elif audio != "0:a" or not profile.cover:
+        args += ["-map", audio]
+
+    track_num = tag_info["track_num"]
+    if isinstance(track_num, (tuple, list)):
+        track_num = "/".join(str(n) for n in track_num)
+    fields = {
+        "title": tag_info["title"],
+        "artist": tag_info["artist"],
+        "album": tag_info["album"],
+        "album_artist": tag_info["album_artist"],
+        "track": track_num,
+        "genre": tag_info["genre"],
+    }
+    match = re.match(r"(\d{4})", str(tag_info.get("year") or ""))
+    if match:
+        fields["date"] = match.group(1)
+    for key, value in fields.items():
+        args += ["-metadata", f"{key}={value or ''}"]
+    return args + list(profile.muxer_args)
+
+
+def cover_input_args(cover: CoverArt | None) -> list[str]:
+    return ["-i", "pipe:0"] if cover else []
+
+
+def get_bits_per_sample(file_path: Path) -> int | None:
+    try:
+        return read_flac_metadata(file_path)["streaminfo"].get("bits_per_sample")
+    except (OSError, FlacFormatError):
+        return None
+
+
+@dataclass
+class TrackOutput:
+    """One file a track is written to, in one output profile."""
+
+    profile: OutputProfile
+    path: Path
+    manifest: ConversionManifest
+    settings: dict
+    # Cover embedded in this file (None if the container cannot hold one)
+    cover: CoverArt | None = None
+    # False for MP3s that only need new tags (see ConversionManifest.plan)
+    encode: bool = True
+    # Where ffmpeg writes the file before it is renamed to ``path``
+    partial: Path = field(init=False)
+
+    def __post_init__(self):
+        self.partial = job_queue.partial_path(self.path)
+
+
+def manifest_tags(tag_info) -> dict:
+    """Tag inputs as hashed into the manifest. ``gapless`` rides along in
+    ``tag_info`` for ``encode_and_tag`` but changes how the track is cut, so
+    it belongs to the encode settings instead (see ``convert_cue_flac``)."""
+    return {k: v for k, v in tag_info.items() if k != "gapless"}
+
+
+def plan_track_outputs(
+    targets, name: str, source: Path, settings: dict, tag_info, cover=None, bits=None
+) -> list[TrackOutput]:
+    """Check every (profile, output_dir, manifest) target for one track and
+    return the outputs that need work. Only MP3s can be re-tagged in place;
+    other formats are encoded again when their tags change."""
+    outputs = []
+    for profile, output_dir, manifest in targets:
+        output_path = output_dir / f"{name}{profile.extension}"
+        track_settings = {"encoder": profile.encoder_args(bits), **settings}
+        track_cover = cover if profile.cover else None
+        action = manifest.plan(
+            output_path, source, track_settings, manifest_tags(tag_info), track_cover
+        )
+        if action == "skip":
+            continue
+        outputs.append(
+            TrackOutput(
+                profile,
+                output_path,
+                manifest,
+                track_settings,
+                track_cover,
+                action == "encode" or profile.name != "mp3",
+            )
+        )
+    return outputs
+
+
+def encode_cover(outputs) -> CoverArt | None:
+    """Cover to pipe into the encode of ``outputs``, if any of them embeds it."""
+    return next((o.cover for o in outputs if o.encode and o.cover), None)
+
+
+def output_args(output: TrackOutput, tag_info, audio="0:a", bits=None) -> list[str]:
+    return [
+        *ffmpeg_tag_args(tag_info, output.cover, audio, output.profile),
+        *output.profile.encoder_args(bits),
+        str(output.partial),
+    ]
+
+
+def build_track_cmd(
+    source: Path, outputs, tag_info, start=None, duration=None, bits=None
+) -> list[str]:
+    """Build one ffmpeg command that decodes ``source`` (or the part from
+    ``start``) once and writes every output that needs encoding."""
+    cmd = ["ffmpeg", "-y"]
+    if start is not None:
+        cmd += ["-ss", str(start)]
+    cmd += ["-i", str(source), *cover_input_args(encode_cover(outputs))]
+    for output in outputs:
+        if not output.encode:
+            continue
+        if start is not None:
+            cmd += ["-t", str(duration) if duration else "9999"]
+        cmd += output_args(output, tag_info, bits=bits)
+    return cmd
+
+
+def build_single_decode_cmd(
+    flac_file: Path, segments, cover: CoverArt | None = None, bits=None
+) -> list[str]:
+    """Build one ffmpeg command that decodes ``flac_file`` once and writes
+    every (start_sample, end_sample, outputs, tag_info) segment, each output
+    in its own profile.
+
+    ``end_sample`` may be None for the last track (read to end of file).
+    The cuts are sample-exact, so FLAC outputs hold exactly the PCM of the
+    image between two CUE indexes.
+    """
+    labels = "".join(f"[s{i}]" for i in range(len(segments)))
+    filters = [f"[0:a]asplit={len(segments)}{labels}"]
+    out_labels = []
+    for i, (start, end, outputs, _) in enumerate(segments):
+        trim = f"atrim=start_sample={start}"
+        if end is not None:
+            trim += f":end_sample={end}"
+        chain = f"[s{i}]{trim},asetpts=PTS-STARTPTS"
+        if len(outputs) == 1:
+            out_labels.append([f"[o{i}]"])
+        else:
+            out_labels.append([f"[o{i}_{j}]" for j in range(len(outputs))])
+            chain += f",asplit={len(outputs)}"
+        filters.append(chain + "".join(out_labels[i]))
+
+    cmd = ["ffmpeg", "-y", "-i", str(flac_file), *cover_input_args(cover)]
+    cmd += ["-filter_complex", ";".join(filters)]
+    for (_, _, outputs, tag_info), labels in zip(segments, out_labels):
+        for output, label in zip(outputs, labels):
+            cmd += output_args(output, tag_info, label, bits)
+    return cmd
+
+
+def outputs_label(outputs) -> str:
+    if len(outputs) == 1:
+        return outputs[0].path.name
+    return f"{outputs[0].path.stem} ({', '.join(o.profile.name for o in outputs)})"
+
+
+def encode_and_tag(cmd, outputs, tag_info, source=None):
+    """Run the encode ``cmd`` (which already tags every output, see
+    ``ffmpeg_tag_args``) and use eyed3 only where it is still needed:
+    re-tagging an existing MP3 (not ``encode``) or adding iTunSMPB, which
+    depends on the LAME header of the finished encode."""
+    if cmd:
+        cover = encode_cover(outputs)
+        try:
+            instrumentation.run(
+                "ffmpeg",
+                cmd,
+                source,
+                outputs[0].path,
+                check=True,
+                input=cover.data if cover else b"",
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except BaseException:
+            finish_outputs(outputs, False)
+            raise
+        finish_outputs(outputs, True)
+    for output in outputs:
+        if output.profile.name != "mp3":
+            continue
+        if output.encode and not tag_info.get("gapless"):
+            continue
+        with instrumentation.stage("tag", output.path, output.path):
+            tag_mp3(output.path, tag_info, output.cover)
+
+
+def finish_outputs(outputs, succeeded: bool):
+    """Rename the encoded files to their final names, or remove them after a
+    failed encode, so a killed or failed run never leaves a truncated track
+    under its final name."""
+    for output in outputs:
+        if not output.encode:
+            continue
+        if succeeded:
+            os.replace(output.partial, output.path)
+        else:
+            output.partial.unlink(missing_ok=True)
+
+
+def record_outputs(outputs, tag_info, source):
+    for output in outputs:
+        output.manifest.record(
+            output.path, source, output.settings, manifest_tags(tag_info), output.cover
+        )
+
+
+class TrackPool:
+    """Bounded worker pool for (cmd, outputs, tag_info, source) track jobs.
+
+    ``submit`` blocks once ``max_pending`` jobs are in flight, so callers can
+    feed it from a generator without queueing the whole library in memory.
+    Finished outputs are recorded in their manifests; a failed track is
+    reported and never cancels the others.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int = 0):
+        max_workers = max(1, max_workers)
+        self.max_pending = max_pending or max_workers * 4
+        self.discovered = 0
+        self.completed = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.wait()
+        self._executor.shutdown()
+
+    def submit(self, job):
+        while len(self._pending) >= self.max_pending:
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+
+        cmd, outputs, tag_info, source = job
+        action = "Converting" if cmd else "Tagging"
+        print(f"🎧 {action}: {outputs_label(outputs)}")
+        future = self._executor.submit(encode_and_tag, cmd, outputs, tag_info, source)
+        self._pending[future] = job
+
+    def wait(self) -> int:
+        if self._pending:
+            done, _ = wait(self._pending)
+            self._collect(done)
+        return self.failed
+
+    def _collect(self, done):
+        for future in done:
+            _, outputs, tag_info, source = self._pending.pop(future)
+            self.completed += 1
+            try:
+                future.result()
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Failed: {outputs_label(outputs)} ({e})")
+                continue
+            record_outputs(outputs, tag_info, source)
+            if self.discovered:
+                print(
+                    f"✓ [{self.completed}/{self.discovered}] {outputs_label(outputs)}"
+                )
+
+
+def run_track_jobs(jobs, max_workers: int) -> int:
+    """Run a list of track jobs to completion; returns the number of failures."""
+    with TrackPool(max_workers) as pool:
+        for job in jobs:
+            pool.submit(job)
+    return pool.failed
+
+
+def output_targets(profiles, base_folder: Path, force: bool = False) -> list:
+    """(profile, output_dir, manifest) per profile, in ``base_folder``."""
+    targets = []
+    for profile in profiles:
+        output_dir = base_folder / profile.output_dir_name
+        output_dir.mkdir(exist_ok=True)
+        targets.append((profile, output_dir, ConversionManifest(output_dir, force)))
+    return targets
+
+
+def save_manifests(targets):
+    for _, _, manifest in targets:
+        manifest.save()
+
+
+def describe_targets(targets) -> str:
+    formats = ", ".join(profile.name.upper() for profile, _, _ in targets)
+    dirs = ", ".join(str(output_dir.resolve()) for _, output_dir, _ in targets)
+    return f"{formats} saved to: {dirs}"
+
+
+def iter_album_dirs(base_folder: Path, skip_dirs=()):
+    """Walk ``base_folder`` with os.scandir and yield (directory, flac_files)
+    per directory as soon as it has been listed.
+
+    Only one directory listing is held in memory at a time, so work can start
+    on the first album while the rest of the tree is still being walked.
+    """
+    skip = {os.path.abspath(d) for d in skip_dirs}
+    stack = [str(base_folder)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"⚠️  Cannot read {current}: {e}")
+            continue
+
+        flac_files = []
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.abspath(entry.path) not in skip:
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith(".flac") and entry.is_file():
+                flac_files.append(Path(entry.path))
+
+        # Reversed so the stack pops subdirectories in sorted order
+        stack.extend(reversed(subdirs))
+        if flac_files:
+            yield Path(current), flac_files
+
+
+def track_source(flac_file: Path, track: dict) -> Path:
+    """Audio file a CUE track lives in: its own FILE entry if that exists
+    next to ``flac_file``, otherwise ``flac_file`` itself."""
+    if track.get("file"):
+        candidate = flac_file.parent / track["file"]
+        if candidate.exists():
+            return candidate
+    return flac_file
+
+
+def convert_cue_flac(
+    info_path: Path,
+    flac_file: Path,
+    jobs: int = DEFAULT_JOBS,
+    single_decode: bool = False,
+    force: bool = False,
+    cover_cache: CoverCache | None = None,
+    gapless: bool = False,
+    profiles=None,
+    output_base: Path = Path("."),
+):
+    """Split a FLAC image into tagged tracks using the tracks in ``info_path``,
+    one file per track in each output profile (MP3 by default).
+
+    With ``gapless`` the image is decoded once and cut at exact sample
+    offsets (implies ``single_decode``), and each MP3 gets an iTunSMPB
+    comment built from its LAME header so players can join tracks seamlessly.
+    A lossless (FLAC) profile also implies ``single_decode``, so the split
+    tracks add up to exactly the samples of the image.
+
+    Each profile writes to ``output_<format>/`` inside ``output_base``.
+    """
+    profiles = profiles or [PROFILES["mp3"]]
+    single_decode = single_decode or gapless or any(p.lossless for p in profiles)
     with open(info_path, "r", encoding="utf-8") as f:
         info = json.load(f)
 
-    output_dir = Path("output_mp3")
-    output_dir.mkdir(exist_ok=True)
+    targets = output_targets(profiles, output_base, force)
     total_tracks = len(info["tracks"])
-    cover = find_cover_for_file(flac_file)
+    cover = (cover_cache or CoverCache()).get(flac_file)
+    lossless = any(p.lossless for p in profiles)
+    sample_rates = {}
+    bit_depths = {}
+    track_jobs = []
+    segments = {}
+    split_jobs = []
+    skipped = 0
 
     for i, track in enumerate(info["tracks"]):
         title = titlecase(track["title"])
+        artist = track.get("performer") or info.get("artist", "")
+        source = track_source(flac_file, track)
         start_sec = cue_index_to_seconds(track["start"])
 
-        # Duration
-        if i < total_tracks - 1:
-            end_sec = cue_index_to_seconds(info["tracks"][i + 1]["start"])
+        # Duration; a track ends where the next one starts in the same file
+        next_track = info["tracks"][i + 1] if i < total_tracks - 1 else None
+        if next_track and track_source(flac_file, next_track) == source:
+            end_sec = cue_index_to_seconds(next_track["start"])
             duration = end_sec - start_sec
         else:
+            end_sec = None
             duration = None
 
-        filename = f"{track['track']:02d}.{slugify(title, separator=' ', lowercase=False)} - {info['artist']}.mp3"
-        output_path = output_dir / filename
-
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss",
-            str(start_sec),
-            "-i",
-            str(flac_file),
-            "-t",
-            str(duration) if duration else "9999",
-            "-codec:a",
-            "libmp3lame",
-            "-qscale:a",
-            "2",
-            str(output_path),
-        ]
-        print(f"🎧 Converting: {filename}")
-        subprocess.run(
-            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
+        name = f"{track['track']:02d}.{slugify(title, separator=' ', lowercase=False)} - {artist}"
 
         tag_info = {
             "title": title,
-            "artist": info.get("artist", ""),
+            "artist": artist,
             "album": titlecase(info.get("album", "")),
             "album_artist": info.get("album_artist", ""),
             "track_num": (track["track"], total_tracks),
             "genre": info.get("genre", ""),
             "year": info.get("year"),
         }
-        tag_mp3(output_path, tag_info, cover)
-
-    print(f"\n✅ Done! MP3 saved to: {output_dir.resolve()}")
-
+        # How the track is cut is part of the encode, so switching an album
+        # to --single-decode or --gapless splits it again. Plain runs keep the
+        # keys of older manifests.
+        settings = {"start": start_sec, "end": end_sec}
+        if single_decode:
+            settings["single_decode"] = True
+        if gapless:
+            settings["gapless"] = True
+            tag_info["gapless"] = True
+        if lossless and source not in bit_depths:
+            bit_depths[source] = get_bits_per_sample(source)
+        outputs = plan_track_outputs(
+            targets,
+            name,
+            source,
+            settings,
+            tag_info,
+            cover,
+            bit_depths.get(source),
+        )
+        if not outputs:
+            skipped += 1
+            continue
+
+        encodes = [o for o in outputs if o.encode]
+        if not encodes:
+            cmd = None
+        elif single_decode:
+            if source not in sample_rates:
+                sample_rates[source] = get_sample_rate(source)
+            sample_rate = sample_rates[source]
+            segments.setdefault(source, []).append(
+                (
+                    seconds_to_samples(start_sec, sample_rate),
+                    (
+                        seconds_to_samples(end_sec, sample_rate)
+                        if end_sec is not None
+                        else None
+                    ),
+                    encodes,
+                    tag_info,
+                )
+            )
+            split_jobs.append((None, encodes, tag_info, source))
+            # MP3s that only need new tags still go through the pool
+            outputs = [o for o in outputs if not o.encode]
+            if not outputs:
+                continue
+            cmd = None
+        else:
+            cmd = build_track_cmd(
+                source, outputs, tag_info, start_sec, duration, bit_depths.get(source)
+            )
 
-def convert_flac_folder(info_path: Path, base_folder: Path):
+        track_jobs.append((cmd, outputs, tag_info, source))
+
+    failed = 0
+    failed_sources = set()
+    for source, source_segments in segments.items():
+        print(f"🎧 Decoding {source.name} once into {len(source_segments)} tracks")
+        cover_in = encode_cover([o for s in source_segments for o in s[2]])
+        try:
+            instrumentation.run(
+                "ffmpeg",
+                build_single_decode_cmd(
+                    source, source_segments, cover_in, bit_depths.get(source)
+                ),
+                source,
+                check=True,
+                input=cover_in.data if cover_in else b"",
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError as e:
+            # Keep going so the other files of the album still finish and
+            # get into the manifest; these tracks are redone on the next run
+            print(f"❌ Failed to split {source.name}: {e}")
+            failed += len(source_segments)
+            failed_sources.add(source)
+            finish_outputs([o for s in source_segments for o in s[2]], False)
+            continue
+        except BaseException:
+            finish_outputs([o for s in source_segments for o in s[2]], False)
+            raise
+        finish_outputs([o for s in source_segments for o in s[2]], True)
+
+    # Split tracks are tagged by the decode itself; only gapless MP3s need
+    # the eyed3 pass for iTunSMPB
+    for job in split_jobs:
+        _, outputs, tag_info, source = job
+        if source in failed_sources:
+            continue
+        if gapless and any(o.profile.name == "mp3" for o in outputs):
+            track_jobs.append(job)
+        else:
+            record_outputs(outputs, tag_info, source)
+
+    failed += run_track_jobs(track_jobs, jobs)
+    save_manifests(targets)
+    if skipped:
+        print(f"\n⏭️  {skipped} unchanged tracks skipped.")
+    if failed:
+        print(f"\n⚠️  {failed} of {total_tracks} tracks failed.")
+    print(f"\n✅ Done! {describe_targets(targets)}")
+    return failed
+
+
+def convert_flac_folder(
+    info_path: Path,
+    base_folder: Path,
+    jobs: int = DEFAULT_JOBS,
+    force: bool = False,
+    cover_cache: CoverCache | None = None,
+    profiles=None,
+    output_base: Path | None = None,
+):
+    profiles = profiles or [PROFILES["mp3"]]
     with open(info_path, "r", encoding="utf-8") as f:
         default_info = json.load(f)
 
-    output_dir = base_folder / "output_mp3"
-    output_dir.mkdir(exist_ok=True)
-
-    flac_files = sorted(base_folder.rglob("*.flac"), key=lambda f: f.name)
-    track_counter = 1
-
-    for flac_file in flac_files:
-        meta = get_metadata_from_flac(flac_file)
-        title = titlecase(meta["title"] or flac_file.stem)
-        artist = meta["artist"] or default_info.get("artist", "")
-        album = titlecase(meta["album"] or default_info.get("album", ""))
-        album_artist = meta["album_artist"] or default_info.get("album_artist", "")
-        year = meta["year"] or default_info.get("year", "")
-        genre = meta["genre"] or default_info.get("genre", "")
-
-        filename = f"{track_counter:02d}.{slugify(title, separator=' ', lowercase=False)} - {artist}.mp3"
-        output_path = output_dir / filename
-
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            str(flac_file),
-            "-codec:a",
-            "libmp3lame",
-            "-qscale:a",
-            "2",
-            str(output_path),
-        ]
-        print(f"🎧 Converting: {filename}")
-        subprocess.run(
-            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    targets = output_targets(profiles, output_base or base_folder, force)
+    output_dirs = [output_dir for _, output_dir, _ in targets]
+    lossless = any(p.lossless for p in profiles)
+    cover_cache = cover_cache or CoverCache()
+    skipped = 0
+
+    with TrackPool(jobs) as pool:
+        for album_dir, flac_files in iter_album_dirs(base_folder, output_dirs):
+            pool.discovered += len(flac_files)
+            print(f"📀 {album_dir} ({len(flac_files)} files, {pool.discovered} found)")
+
+            relative_dir = album_dir.relative_to(base_folder)
+            album_targets = []
+            for profile, output_dir, manifest in targets:
+                album_output_dir = output_dir / relative_dir
+                album_output_dir.mkdir(parents=True, exist_ok=True)
+                album_targets.append((profile, album_output_dir, manifest))
+            cover = cover_cache.get(album_dir)
+            metadata = get_metadata_batch(flac_files, jobs)
+
+            for track_num, (flac_file, meta) in enumerate(
+                zip(flac_files, metadata), start=1
+            ):
+                title = titlecase(meta["title"] or flac_file.stem)
+                artist = meta["artist"] or default_info.get("artist", "")
+                album = titlecase(meta["album"] or default_info.get("album", ""))
+                album_artist = meta["album_artist"] or default_info.get(
+                    "album_artist", ""
+                )
+                year = meta["year"] or default_info.get("year", "")
+                genre = meta["genre"] or default_info.get("genre", "")
+
+                name = f"{track_num:02d}.{slugify(title, separator=' ', lowercase=False)} - {artist}"
+
+                tag_info = {
+                    "title": title,
+                    "artist": artist,
+                    "album": album,
+                    "album_artist": album_artist,
+                    "track_num": track_num,
+                    "genre": genre,
+                    "year": year,
+                }
+                bits = get_bits_per_sample(flac_file) if lossless else None
+                outputs = plan_track_outputs(
+                    album_targets, name, flac_file, {}, tag_info, cover, bits
+                )
+                if not outputs:
+                    skipped += 1
+                    pool.completed += 1
+                    continue
+
+                cmd = None
+                if any(o.encode for o in outputs):
+                    cmd = build_track_cmd(flac_file, outputs, tag_info, bits=bits)
+                pool.submit((cmd, outputs, tag_info, flac_file))
+
+    save_manifests(targets)
+    converted = pool.completed - skipped - pool.failed
+    if skipped:
+        print(f"\n⏭️  {skipped} unchanged tracks skipped.")
+    if pool.failed:
+        print(f"\n⚠️  {pool.failed} of {converted + pool.failed} tracks failed.")
+    print(f"\n✅ Done! Converted {converted} tracks. {describe_targets(targets)}")
+    return pool.failed
+
+
+def run_queued_album(payload: dict, capacity: dict):
+    """Job handler for ``worker``: one album submitted with --queue."""
+    profiles = parse_profiles(payload["formats"])
+    jobs = capacity.get("cores") or DEFAULT_JOBS
+    cover_cache = CoverCache(payload["cover_max_size"], payload["cover_max_bytes"])
+    if payload["flac"]:
+        failed = convert_cue_flac(
+            Path(payload["meta"]),
+            Path(payload["flac"]),
+            jobs,
+            payload["single_decode"],
+            payload["force"],
+            cover_cache,
+            payload["gapless"],
+            profiles,
+            Path(payload["output_base"]),
         )
-
-        tag_info = {
-            "title": title,
-            "artist": artist,
-            "album": album,
-            "album_artist": album_artist,
-            "track_num": track_counter,
-            "genre": genre,
-            "year": year,
-        }
-        cover = find_cover_for_file(flac_file)
-        tag_mp3(output_path, tag_info, cover)
-
-        track_counter += 1
-
-    print(f"\n✅ Done! Converted {track_counter - 1} tracks to: {output_dir.resolve()}")
+    else:
+        failed = convert_flac_folder(
+            Path(payload["meta"]),
+            Path(payload["path"]),
+            jobs,
+            payload["force"],
+            cover_cache,
+            profiles,
+        )
+    if failed:
+        raise RuntimeError(f"{failed} tracks failed")
+
+
+def submit_album(args):
+    """Queue the album for a ``worker`` instead of converting it here. Paths
+    are stored absolute, so workers need the same mount points."""
+    payload = {
+        "meta": str(args.meta.resolve()),
+        "flac": str(args.flac.resolve()) if args.flac else None,
+        "path": str(args.path.resolve()) if args.path else None,
+        # convert_cue_flac writes next to where it was started
+        "output_base": str(Path.cwd()),
+        "formats": args.formats,
+        "single_decode": args.single_decode,
+        "gapless": args.gapless,
+        "force": args.force,
+        "cover_max_size": args.cover_max_size,
+        "cover_max_bytes": args.cover_max_kb * 1024,
+    }
+    try:
+        job_id = job_queue.open_queue(args.queue).submit(
+            kind="audio.convert", payload=payload, requires={"ffmpeg": True}
+        )
+    except job_queue.QUEUE_ERRORS as e:
+        print(f"❌ Queue unavailable: {e}")
+        sys.exit(1)
+    print(f"📥 Queued as job {job_id} in {args.queue}")
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Convert FLAC to MP3 with tagging.")
+    # `worker` subcommand: run albums submitted with --queue
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        job_queue.worker_main(
+            sys.argv[2:],
+            {"audio.convert": run_queued_album},
+            "Convert albums from a shared job queue.",
+        )
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Convert FLAC to MP3 (or Opus, AAC, FLAC) with tagging."
+    )
     parser.add_argument("-f", "--flac", type=Path, help="Single FLAC file (big album)")
     parser.add_argument(
         "-p", "--path", type=Path, help="Folder with multiple FLAC files"
@@ -206,6 +893,61 @@ def main():
         required=True,
         help="Path to metadata JSON (info.json)",
     )
+    parser.add_argument(
+        "--single-decode",
+        action="store_true",
+        help="With --flac: decode the image once and split all tracks in one ffmpeg run",
+    )
+    parser.add_argument(
+        "--gapless",
+        action="store_true",
+        help="With --flac: sample-exact cuts plus iTunSMPB gapless info (implies --single-decode)",
+    )
+    parser.add_argument(
+        "--formats",
+        default=DEFAULT_PROFILES,
+        help="Comma-separated output formats with optional setting, e.g. "
+        f"mp3,opus:96k,flac:8 (default: {DEFAULT_PROFILES}; choose from {', '.join(PROFILES)})",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-encode every track, ignoring the conversion manifest",
+    )
+    parser.add_argument(
+        "--cover-max-size",
+        type=int,
+        default=0,
+        help="Downscale embedded covers larger than this many pixels per side",
+    )
+    parser.add_argument(
+        "--cover-max-kb",
+        type=int,
+        default=0,
+        help="Re-compress embedded covers larger than this many KB",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Number of tracks to encode in parallel (default: {DEFAULT_JOBS})",
+    )
+    parser.add_argument(
+        "--queue",
+        help="Submit the album to this job queue (database file or coordinator URL) "
+        "instead of converting it here; see the worker subcommand",
+    )
+    parser.add_argument(
+        "--events",
+        type=Path,
+        help="Append a JSON line per timed step (ffprobe, ffmpeg, tagging, ...) to this file",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print per-stage totals and the slowest steps at the end",
+    )
 
     args = parser.parse_args()
 
@@ -213,13 +955,37 @@ def main():
         print("❌ Cannot use both --flac and --path at the same time.")
         return
 
+    try:
+        profiles = parse_profiles(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.queue and (args.flac or args.path):
+        submit_album(args)
+        return
+
+    instrumentation.configure(args.events, args.timings)
+    cover_cache = CoverCache(args.cover_max_size, args.cover_max_kb * 1024)
+
     if args.flac:
-        convert_cue_flac(args.meta, args.flac)
+        convert_cue_flac(
+            args.meta,
+            args.flac,
+            args.jobs,
+            args.single_decode,
+            args.force,
+            cover_cache,
+            args.gapless,
+            profiles,
+        )
     elif args.path:
-        convert_flac_folder(args.meta, args.path)
+        convert_flac_folder(
+            args.meta, args.path, args.jobs, args.force, cover_cache, profiles
+        )
     else:
         print("❌ Must specify either --flac or --path")
         parser.print_help()
+    instrumentation.summary()
 
 
 if __name__ == "__main__":
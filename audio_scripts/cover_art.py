@@ -0,0 +1,135 @@
+import os
+import struct
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import filetype
+
+import instrumentation
+
+COVER_NAMES = ["folder", "cover"]
+COVER_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+JPEG_QUALITY_STEPS = [3, 6, 10, 15]
+
+
+@dataclass(frozen=True)
+class CoverArt:
+    path: Path
+    data: bytes
+    mime: str
+
+
+def find_cover(directory: Path) -> Path | None:
+    """Return the preferred cover image in ``directory`` using one listing.
+
+    ``folder.*`` wins over ``cover.*``; names are matched case-insensitively.
+    """
+    try:
+        with os.scandir(directory) as it:
+            names = {e.name.lower(): e.name for e in it if e.is_file()}
+    except OSError:
+        return None
+
+    for stem in COVER_NAMES:
+        for ext in COVER_EXTENSIONS:
+            name = names.get(stem + ext)
+            if name:
+                return directory / name
+    return None
+
+
+def image_size(data: bytes) -> tuple[int, int] | None:
+    """Width and height of a PNG or JPEG image, read from its header."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 9 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                pos += 2
+                continue
+            (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+            # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[pos + 5 : pos + 9])
+                return width, height
+            pos += 2 + length
+    return None
+
+
+def downscale_image(data: bytes, max_size: int = 0, max_bytes: int = 0) -> bytes:
+    """Re-encode ``data`` as JPEG no larger than ``max_size`` pixels per side,
+    lowering quality until it fits in ``max_bytes`` (if set).
+
+    Returns the original bytes if it already fits or ffmpeg fails.
+    """
+    size = image_size(data)
+    too_large = bool(max_size and size and max(size) > max_size)
+    too_heavy = bool(max_bytes and len(data) > max_bytes)
+    if not (too_large or too_heavy):
+        return data
+
+    scale = []
+    if max_size:
+        scale = [
+            "-vf",
+            f"scale='min(iw,{max_size})':'min(ih,{max_size})'"
+            ":force_original_aspect_ratio=decrease",
+        ]
+
+    result = data
+    for quality in JPEG_QUALITY_STEPS:
+        proc = subprocess.run(
+            ["ffmpeg", "-v", "error", "-f", "image2pipe", "-i", "pipe:0", *scale]
+            + ["-q:v", str(quality), "-f", "image2", "-c:v", "mjpeg", "pipe:1"],
+            input=data,
+            capture_output=True,
+        )
+        if proc.returncode != 0 or not proc.stdout:
+            break
+        result = proc.stdout
+        if not max_bytes or len(result) <= max_bytes:
+            break
+    return result
+
+
+class CoverCache:
+    """Resolve and load one cover per directory, shared by all its tracks."""
+
+    def __init__(self, max_size: int = 0, max_bytes: int = 0):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._covers = {}
+
+    def get(self, path: Path) -> CoverArt | None:
+        directory = path if path.is_dir() else path.parent
+        with self._lock:
+            if directory not in self._covers:
+                self._covers[directory] = self._load(directory)
+            return self._covers[directory]
+
+    def _load(self, directory: Path) -> CoverArt | None:
+        cover_path = find_cover(directory)
+        if cover_path is None:
+            return None
+        with instrumentation.stage("cover", cover_path) as event:
+            try:
+                data = cover_path.read_bytes()
+            except OSError as e:
+                print(f"⚠️  Cannot read cover {cover_path}: {e}")
+                return None
+
+            data = downscale_image(data, self.max_size, self.max_bytes)
+            event["bytes_out"] = len(data)
+        mime = filetype.guess_mime(data) or "image/jpeg"
+        return CoverArt(cover_path, data, mime)
@@ -0,0 +1,124 @@
+import re
+from pathlib import Path
+
+# A quoted string or a bare word; quotes are optional in most CUE writers.
+TOKEN_RE = re.compile(r'"([^"]*)"?|(\S+)')
+FALLBACK_ENCODINGS = ["utf-8", "cp1258", "latin-1"]
+
+
+def decode_cue_bytes(data: bytes, encoding: str | None = None) -> str:
+    """Decode a .cue file, honouring BOMs and falling back through common
+    legacy code pages when no encoding is given."""
+    if encoding:
+        return data.decode(encoding)
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8")
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+
+    for candidate in FALLBACK_ENCODINGS:
+        try:
+            return data.decode(candidate)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1", errors="replace")
+
+
+def tokenize_line(line: str) -> list[str]:
+    return [
+        m.group(1) if m.group(1) is not None else m.group(2)
+        for m in TOKEN_RE.finditer(line)
+    ]
+
+
+def parse_cuesheet(text: str) -> dict:
+    """Parse CUE sheet text in a single pass over its lines.
+
+    Returns ``{"title", "performer", "rem", "files", "tracks"}`` where each
+    track is ``{"track", "title", "performer", "file", "index"}`` and
+    ``index`` maps INDEX numbers (0 = pregap, 1 = start) to ``mm:ss:ff``.
+    """
+    sheet = {"title": None, "performer": None, "rem": {}, "files": [], "tracks": []}
+    current_file = None
+    track = None
+
+    for raw_line in text.splitlines():
+        tokens = tokenize_line(raw_line.strip())
+        if not tokens:
+            continue
+        keyword = tokens[0].upper()
+        args = tokens[1:]
+
+        if keyword == "FILE" and args:
+            current_file = args[0]
+            sheet["files"].append(current_file)
+        elif keyword == "TRACK" and args:
+            try:
+                number = int(args[0])
+            except ValueError:
+                track = None
+                continue
+            track = {
+                "track": number,
+                "title": None,
+                "performer": None,
+                "file": current_file,
+                "index": {},
+            }
+            sheet["tracks"].append(track)
+        elif keyword == "INDEX" and len(args) >= 2 and track is not None:
+            try:
+                track["index"][int(args[0])] = args[1]
+            except ValueError:
+                continue
+        elif keyword in ("TITLE", "PERFORMER") and args:
+            target = track if track is not None else sheet
+            target[keyword.lower()] = " ".join(args)
+        elif keyword == "REM" and len(args) >= 2:
+            sheet["rem"].setdefault(args[0].upper(), " ".join(args[1:]))
+
+    return sheet
+
+
+def read_cue_file(path: Path, encoding: str | None = None) -> dict:
+    return parse_cuesheet(decode_cue_bytes(path.read_bytes(), encoding))
+
+
+def cuesheet_to_info(sheet: dict, tags: dict | None = None) -> dict:
+    """Build the info.json structure consumed by convert_cue_flac.
+
+    File tags (lowercase keys, as returned by flac_meta) take precedence
+    over album-level CUE fields.
+    """
+    tags = tags or {}
+    rem = sheet["rem"]
+    performer = sheet["performer"] or ""
+    year = tags.get("date") or tags.get("year") or rem.get("DATE", "")
+    match = re.search(r"\d{4}", year)
+
+    tracks = []
+    for track in sheet["tracks"]:
+        start = track["index"].get(1) or track["index"].get(0)
+        if start is None:
+            continue
+        entry = {
+            "track": track["track"],
+            "title": track["title"] or f"Track {track['track']:02d}",
+            "start": start,
+        }
+        if track["performer"] and track["performer"] != performer:
+            entry["performer"] = track["performer"]
+        if 0 in track["index"] and 1 in track["index"]:
+            entry["pregap"] = track["index"][0]
+        if len(sheet["files"]) > 1 and track["file"]:
+            entry["file"] = track["file"]
+        tracks.append(entry)
+
+    return {
+        "album": tags.get("album") or sheet["title"] or "",
+        "album_artist": tags.get("album_artist") or performer,
+        "artist": tags.get("artist") or performer,
+        "genre": tags.get("genre") or rem.get("GENRE", ""),
+        "year": match.group(0) if match else "",
+        "tracks": tracks,
+    }
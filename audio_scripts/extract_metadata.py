@@ -1,17 +1,36 @@
+import argparse
+import os
 import subprocess
 import json
 import sys
-import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import instrumentation
+from cover_art import find_cover
+from cuesheet import cuesheet_to_info, parse_cuesheet, read_cue_file
+from flac_meta import (
+    FlacFormatError,
+    front_cover,
+    probe_tags_ffprobe,
+    read_flac_metadata,
+    read_tags,
+)
+
+DEFAULT_JOBS = os.cpu_count() or 1
+COVER_EXTENSIONS = {"image/png": ".png", "image/gif": ".gif"}
+
 
 def extract_cover(flac_path: Path, output_jpg: Path = Path("folder.jpg")):
     if output_jpg.exists():
         print("🖼️  folder.jpg already exists. Skipping cover extract.")
         return
     try:
-        subprocess.run(
+        instrumentation.run(
+            "ffmpeg",
             ["ffmpeg", "-i", str(flac_path), "-an", "-vcodec", "copy", str(output_jpg)],
+            flac_path,
+            output_jpg,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             check=True,
@@ -21,72 +40,183 @@ def extract_cover(flac_path: Path, output_jpg: Path = Path("folder.jpg")):
         print("⚠️  No embedded cover art found or extraction failed.")
 
 
-def extract_info(flac_path: Path, output_json: Path = Path("info.json")) -> None:
-    result = subprocess.run(
-        ["ffmpeg", "-i", str(flac_path)],
-        stderr=subprocess.PIPE,
-        stdout=subprocess.DEVNULL,
-        text=True,
-    )
-    metadata_raw = result.stderr
+def extract_info(
+    flac_path: Path,
+    output_json: Path = Path("info.json"),
+    cue_path: Path | None = None,
+    cue_encoding: str | None = None,
+    tags: dict | None = None,
+) -> None:
+    if tags is None:
+        tags = read_tags(flac_path)
 
-    if not metadata_raw:
-        print(f"❌ ffmpeg failed to extract metadata from {flac_path}")
-        return
+    if cue_path is None and not tags.get("cuesheet"):
+        sibling = flac_path.with_suffix(".cue")
+        if sibling.exists():
+            cue_path = sibling
 
-    album = re.search(r"ALBUM\s*:\s*(.+)", metadata_raw, re.IGNORECASE)
-    album_artist = re.search(r"album_artist\s*:\s*(.+)", metadata_raw, re.IGNORECASE)
-    if not album_artist:
-        album_artist = re.search(
-            r"ALBUM ARTIST\s*:\s*(.+)", metadata_raw, re.IGNORECASE
-        )
-    artist = re.search(r"ARTIST\s*:\s*(.+)", metadata_raw, re.IGNORECASE)
-    if not artist:
-        artist = re.search(r"PERFORMER\s*:\s*(.+)", metadata_raw, re.IGNORECASE)
-
-    genre = re.search(r"GENRE\s*:\s*(.+)", metadata_raw, re.IGNORECASE)
-    if not genre:
-        genre = re.search(r'REM GENRE\s+"([^"]+)"', metadata_raw, re.IGNORECASE)
-    if not genre:
-        genre = re.search(r"REM GENRE\s+(.+)", metadata_raw, re.IGNORECASE)
-    year = re.search(r"DATE\s*:\s*(\d{4})", metadata_raw, re.IGNORECASE)
-    if not year:
-        year = re.search(r'REM DATE\s+"?(\d{4})"?', metadata_raw, re.IGNORECASE)
-    cuesheet = re.findall(
-        r'TRACK\s+(\d+)\s+AUDIO.*?TITLE\s+"(.+?)".*?INDEX 01\s+(\d+:\d+:\d+)',
-        metadata_raw,
-        re.DOTALL | re.IGNORECASE,
-    )
+    try:
+        if cue_path:
+            with instrumentation.stage("cue", cue_path):
+                sheet = read_cue_file(cue_path, cue_encoding)
+            print(f"📄 Using cue sheet {cue_path}")
+        else:
+            sheet = parse_cuesheet(tags.get("cuesheet", ""))
+    except (OSError, UnicodeDecodeError, LookupError) as e:
+        print(f"❌ Failed to read cue sheet {cue_path}: {e}")
+        return
 
-    info = {
-        "album": album.group(1).strip() if album else "",
-        "album_artist": album_artist.group(1).strip() if album_artist else "",
-        "artist": artist.group(1).strip() if artist else "",
-        "genre": genre.group(1).strip() if genre else "",
-        "year": year.group(1).strip() if year else "",
-        "tracks": [
-            {"track": int(num), "title": title.strip(), "start": index.strip()}
-            for num, title, index in cuesheet
-        ],
-    }
+    info = cuesheet_to_info(sheet, tags)
+    if not info["tracks"]:
+        print(f"⚠️  No cue sheet tracks found for {flac_path}")
 
     try:
-        with output_json.open("w", encoding="utf-8") as f:
-            json.dump(info, f, indent=2, ensure_ascii=False)
+        with instrumentation.stage("write", output_json, output_json):
+            with output_json.open("w", encoding="utf-8") as f:
+                json.dump(info, f, indent=2, ensure_ascii=False)
         print(f"✅ Saved metadata to {output_json}")
     except Exception as e:
         print(f"❌ Failed to write metadata: {e}")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python convert_flac_mp3.py file.flac")
+def write_cover(picture: dict, output_dir: Path) -> None:
+    existing = find_cover(output_dir)
+    if existing:
+        print(f"🖼️  {existing.name} already exists. Skipping cover extract.")
+        return
+    extension = COVER_EXTENSIONS.get(picture["mime"].lower(), ".jpg")
+    output_path = output_dir / f"folder{extension}"
+    with instrumentation.stage("write", output_path, output_path):
+        output_path.write_bytes(picture["data"])
+    print(f"✅ Extracted cover art to {output_path}")
+
+
+def extract_album(
+    flac_files: list[Path],
+    output_dir: Path,
+    cue_path: Path | None = None,
+    cue_encoding: str | None = None,
+) -> None:
+    """Write info.json and the cover for one album from a single read of the
+    FLAC metadata blocks.
+
+    The first readable file supplies the tags (and cue sheet); the first file
+    with an embedded PICTURE supplies the cover. ffprobe/ffmpeg are only used
+    when no file can be parsed natively.
+    """
+    image = flac_files[0]
+    tags = None
+    picture = None
+    for flac_file in flac_files:
+        try:
+            meta = read_flac_metadata(flac_file, pictures=True)
+        except (OSError, FlacFormatError):
+            continue
+        if tags is None:
+            image, tags = flac_file, meta["tags"]
+        picture = front_cover(meta["pictures"])
+        if picture:
+            break
+
+    native = tags is not None
+    if not native:
+        tags = probe_tags_ffprobe(image)
+
+    extract_info(image, output_dir / "info.json", cue_path, cue_encoding, tags)
+    if picture:
+        write_cover(picture, output_dir)
+    elif not native and find_cover(output_dir) is None:
+        extract_cover(image, output_dir / "folder.jpg")
+
+
+def collect_albums(paths: list[Path]) -> dict[Path, list[Path]]:
+    """Group the FLAC files under ``paths`` by the directory they live in."""
+    albums = {}
+    for path in paths:
+        if path.is_file():
+            albums.setdefault(path.parent, []).append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            flac_files = sorted(f for f in files if f.lower().endswith(".flac"))
+            if flac_files:
+                albums.setdefault(Path(root), []).extend(
+                    Path(root) / f for f in flac_files
+                )
+    return albums
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract info.json and cover art from FLAC albums."
+    )
+    parser.add_argument(
+        "paths",
+        type=Path,
+        nargs="+",
+        help="FLAC files and/or directories to scan recursively",
+    )
+    parser.add_argument(
+        "-c",
+        "--cue",
+        type=Path,
+        help="External .cue file (default: embedded CUESHEET, then <flac>.cue)",
+    )
+    parser.add_argument(
+        "--cue-encoding",
+        help="Encoding of the .cue file (default: auto-detect)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Number of albums to process in parallel (default: {DEFAULT_JOBS})",
+    )
+    parser.add_argument(
+        "--events",
+        type=Path,
+        help="Append a JSON line per timed step (metadata read, ffprobe, ...) to this file",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print per-stage totals and the slowest steps at the end",
+    )
+    args = parser.parse_args()
+    instrumentation.configure(args.events, args.timings)
+
+    missing = [p for p in args.paths if not p.exists()]
+    if missing:
+        for path in missing:
+            print(f"❌ File not found: {path}")
         sys.exit(1)
 
-    flac_file = Path(sys.argv[1])
-    if not flac_file.exists():
-        print(f"❌ File not found: {flac_file}")
+    # A single FLAC file keeps the original behaviour: outputs go to the
+    # current directory. Anything else writes next to each album.
+    if len(args.paths) == 1 and args.paths[0].is_file():
+        extract_album(args.paths, Path("."), args.cue, args.cue_encoding)
+        instrumentation.summary()
+        return
+
+    if args.cue:
+        print("❌ --cue can only be used with a single FLAC file.")
         sys.exit(1)
 
-    extract_info(flac_file)
-    extract_cover(flac_file)
+    albums = collect_albums(args.paths)
+    print(f"Found {len(albums)} album folders")
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {
+            pool.submit(extract_album, flac_files, album_dir): album_dir
+            for album_dir, flac_files in albums.items()
+        }
+        for future, album_dir in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Failed: {album_dir} ({e})")
+    instrumentation.summary()
+
+
+if __name__ == "__main__":
+    main()
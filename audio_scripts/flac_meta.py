@@ -0,0 +1,180 @@
+import json
+import struct
+from pathlib import Path
+
+import instrumentation
+
+STREAMINFO = 0
+VORBIS_COMMENT = 4
+PICTURE = 6
+FRONT_COVER = 3
+
+# ffprobe renames a few Vorbis comment fields; keep the same keys so callers
+# get identical dicts whichever reader produced them.
+VORBIS_KEY_MAP = {
+    "albumartist": "album_artist",
+    "album artist": "album_artist",
+    "tracknumber": "track",
+    "discnumber": "disc",
+    "description": "comment",
+}
+
+
+class FlacFormatError(ValueError):
+    pass
+
+
+def skip_id3v2(f) -> None:
+    """Position ``f`` after a leading ID3v2 tag, if there is one."""
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = 0
+        for byte in header[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        # Flag 0x10: a 10-byte footer follows the tag
+        f.seek(10 + size + (10 if header[5] & 0x10 else 0))
+    else:
+        f.seek(0)
+
+
+def _parse_streaminfo(data: bytes) -> dict:
+    if len(data) < 18:
+        raise FlacFormatError("STREAMINFO block too short")
+    packed = int.from_bytes(data[10:18], "big")
+    return {
+        "sample_rate": packed >> 44,
+        "channels": ((packed >> 41) & 0x7) + 1,
+        "bits_per_sample": ((packed >> 36) & 0x1F) + 1,
+        "total_samples": packed & 0xFFFFFFFFF,
+    }
+
+
+def _parse_vorbis_comment(data: bytes) -> dict:
+    try:
+        (vendor_len,) = struct.unpack_from("<I", data, 0)
+        pos = 4 + vendor_len
+        (count,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        tags = {}
+        for _ in range(count):
+            (length,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            if pos + length > len(data):
+                raise FlacFormatError("Corrupt VORBIS_COMMENT block: entry past end")
+            entry = data[pos : pos + length].decode("utf-8", errors="replace")
+            pos += length
+            key, sep, value = entry.partition("=")
+            if not sep:
+                continue
+            key = key.lower()
+            key = VORBIS_KEY_MAP.get(key, key)
+            tags[key] = f"{tags[key]};{value}" if key in tags else value
+        return tags
+    except struct.error as e:
+        raise FlacFormatError(f"Corrupt VORBIS_COMMENT block: {e}") from e
+
+
+def _parse_picture(data: bytes) -> dict:
+    try:
+        picture_type, mime_len = struct.unpack_from(">II", data, 0)
+        pos = 8
+        mime = data[pos : pos + mime_len].decode("ascii", errors="replace")
+        pos += mime_len
+        (desc_len,) = struct.unpack_from(">I", data, pos)
+        pos += 4 + desc_len
+        width, height, _, _, data_len = struct.unpack_from(">IIIII", data, pos)
+        pos += 20
+        if pos + data_len > len(data):
+            raise FlacFormatError("Corrupt PICTURE block: image data past end")
+        return {
+            "type": picture_type,
+            "mime": mime,
+            "width": width,
+            "height": height,
+            "data": data[pos : pos + data_len],
+        }
+    except struct.error as e:
+        raise FlacFormatError(f"Corrupt PICTURE block: {e}") from e
+
+
+def _read_block(f, length: int, file_path: Path) -> bytes:
+    data = f.read(length)
+    if len(data) < length:
+        raise FlacFormatError(f"Truncated metadata block in {file_path}")
+    return data
+
+
+def front_cover(pictures: list[dict]) -> dict | None:
+    """The front cover picture, or the first picture if none is marked so."""
+    for picture in pictures:
+        if picture["type"] == FRONT_COVER:
+            return picture
+    return pictures[0] if pictures else None
+
+
+def read_flac_metadata(file_path: Path, pictures: bool = False) -> dict:
+    """Read STREAMINFO and Vorbis comments from the FLAC metadata blocks.
+
+    Only the metadata header is read; audio frames are never touched.
+    Returns ``{"streaminfo": {...}, "tags": {...}, "pictures": [...]}`` with
+    lowercase tag keys. PICTURE blocks are skipped unless ``pictures`` is set.
+    """
+    result = {"streaminfo": {}, "tags": {}, "pictures": []}
+    with instrumentation.stage("metadata", file_path), open(file_path, "rb") as f:
+        skip_id3v2(f)
+        if f.read(4) != b"fLaC":
+            raise FlacFormatError(f"Not a FLAC file: {file_path}")
+
+        last = False
+        while not last:
+            header = f.read(4)
+            if len(header) < 4:
+                raise FlacFormatError(f"Truncated metadata in {file_path}")
+            last = bool(header[0] & 0x80)
+            block_type = header[0] & 0x7F
+            length = int.from_bytes(header[1:4], "big")
+
+            if block_type == STREAMINFO:
+                result["streaminfo"] = _parse_streaminfo(
+                    _read_block(f, length, file_path)
+                )
+            elif block_type == VORBIS_COMMENT:
+                result["tags"] = _parse_vorbis_comment(
+                    _read_block(f, length, file_path)
+                )
+            elif block_type == PICTURE and pictures:
+                result["pictures"].append(
+                    _parse_picture(_read_block(f, length, file_path))
+                )
+            else:
+                f.seek(length, 1)
+    return result
+
+
+def probe_tags_ffprobe(file_path: Path) -> dict:
+    result = instrumentation.run(
+        "ffprobe",
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format_tags",
+            "-of",
+            "json",
+            str(file_path),
+        ],
+        file_path,
+        capture_output=True,
+        text=True,
+    )
+    data = json.loads(result.stdout or "{}")
+    return {k.lower(): v for k, v in data.get("format", {}).get("tags", {}).items()}
+
+
+def read_tags(file_path: Path) -> dict:
+    """Lowercase tag dict, from the FLAC header or via ffprobe as a fallback."""
+    try:
+        return read_flac_metadata(file_path)["tags"]
+    except (OSError, FlacFormatError):
+        return probe_tags_ffprobe(file_path)
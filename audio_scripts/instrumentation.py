@@ -0,0 +1,148 @@
+"""Per-stage timing shared by the audio and video scripts.
+
+Every timed step (an ffprobe/ffmpeg/HandBrake run, a tag write, ...) becomes
+one event with ``stage``, ``file``, ``duration``, ``bytes_in``, ``bytes_out``
+and ``exit_code``. Nothing is recorded until ``configure`` is called; then the
+events are kept for ``summary`` and, with an events path, appended to that
+file as JSON lines as soon as each step finishes.
+
+``video_scripts/instrumentation.py`` is a symlink to this file.
+"""
+
+import json
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SLOWEST_ITEMS = 10
+
+
+def file_size(path) -> int | None:
+    try:
+        return Path(path).stat().st_size if path else None
+    except OSError:
+        return None
+
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Recorder:
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._out = None
+
+    def configure(self, events_path: Path | None = None, enabled: bool = True):
+        self.enabled = enabled or events_path is not None
+        if events_path is not None:
+            Path(events_path).parent.mkdir(parents=True, exist_ok=True)
+            # Line-buffered so an interrupted run still leaves complete lines
+            self._out = open(events_path, "a", encoding="utf-8", buffering=1)
+
+    @contextmanager
+    def stage(self, name: str, file=None, output=None):
+        """Time the ``with`` block as one event of stage ``name``.
+
+        ``file`` is the input (its size becomes ``bytes_in``) and ``output``
+        the file written (``bytes_out``, measured when the block ends). The
+        yielded dict can be updated, e.g. with ``exit_code``.
+        """
+        event = {"stage": name, "file": str(file) if file is not None else None}
+        if not self.enabled:
+            yield event
+            return
+
+        event["bytes_in"] = file_size(file)
+        event["start"] = time.time()
+        started = time.perf_counter()
+        try:
+            yield event
+        except subprocess.CalledProcessError as e:
+            event["exit_code"] = e.returncode
+            raise
+        except Exception as e:
+            event["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event["duration"] = round(time.perf_counter() - started, 4)
+            if output is not None:
+                event.setdefault("bytes_out", file_size(output))
+            event.setdefault("exit_code", None)
+            self._emit(event)
+
+    def run(self, name: str, cmd, file=None, output=None, **kwargs):
+        """``subprocess.run`` recorded as one event of stage ``name``."""
+        with self.stage(name, file, output) as event:
+            result = subprocess.run(cmd, **kwargs)
+            event["exit_code"] = result.returncode
+        return result
+
+    def _emit(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+            if self._out:
+                self._out.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def summary(self, slowest: int = SLOWEST_ITEMS):
+        """Print per-stage totals and the slowest steps, then close the
+        events file."""
+        if not self.enabled:
+            return
+        with self._lock:
+            events = list(self.events)
+            if self._out:
+                self._out.close()
+                self._out = None
+
+        totals = {}
+        for event in events:
+            total = totals.setdefault(
+                event["stage"],
+                {
+                    "count": 0,
+                    "seconds": 0.0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                    "failed": 0,
+                },
+            )
+            total["count"] += 1
+            total["seconds"] += event["duration"]
+            total["bytes_in"] += event.get("bytes_in") or 0
+            total["bytes_out"] += event.get("bytes_out") or 0
+            if event.get("error") or event.get("exit_code") not in (None, 0):
+                total["failed"] += 1
+
+        print(f"\nTiming summary ({len(events)} steps)")
+        for name, total in sorted(totals.items(), key=lambda t: -t[1]["seconds"]):
+            line = (
+                f"  {name:<10} {total['count']:>5} x {total['seconds']:9.2f}s"
+                f"  in {format_bytes(total['bytes_in']):>9}"
+                f"  out {format_bytes(total['bytes_out']):>9}"
+            )
+            if total["failed"]:
+                line += f"  ({total['failed']} failed)"
+            print(line)
+
+        if events and slowest:
+            print("Slowest steps:")
+            for event in sorted(events, key=lambda e: -e["duration"])[:slowest]:
+                print(
+                    f"  {event['duration']:9.2f}s  {event['stage']:<10} {event['file']}"
+                )
+
+
+# One recorder per process, shared by every module that imports this one
+RECORDER = Recorder()
+configure = RECORDER.configure
+stage = RECORDER.stage
+run = RECORDER.run
+summary = RECORDER.summary
@@ -0,0 +1,581 @@
+"""Shared job queue so several hosts can work through one backlog.
+
+Jobs live in a SQLite database. Workers either open that database directly
+(``--queue /shared/queue.sqlite``, fine for workers on one machine) or talk
+to a small HTTP coordinator that owns it (``python job_queue.py serve``,
+then ``--queue http://host:8765``), which is safer across hosts because
+SQLite locking over network filesystems is unreliable.
+
+A worker claims a job with a lease and keeps renewing it while the handler
+runs. Jobs whose lease runs out (worker crashed or lost the network) go back
+to the queue, and failed jobs are retried with a growing delay until
+``max_attempts``. Workers declare their capacity (cores, HandBrake, ffmpeg)
+and only get jobs whose requirements they meet.
+
+``video_scripts/job_queue.py`` is a symlink to this file.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import instrumentation
+
+DEFAULT_PORT = 8765
+DEFAULT_LEASE = 120
+DEFAULT_POLL = 5.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+API_METHODS = ("submit", "claim", "heartbeat", "complete", "fail", "retry", "status")
+# What a queue call raises when the queue cannot be reached or used: network
+# and HTTP errors from QueueClient, locking/IO errors from a JobStore file
+QUEUE_ERRORS = (OSError, sqlite3.Error)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    requires TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority, id);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    capacity TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+def satisfies(capacity: dict, requires: dict) -> bool:
+    """True if ``capacity`` meets every requirement: flags must be set,
+    numbers must be at least as large."""
+    for key, need in requires.items():
+        have = capacity.get(key)
+        if isinstance(need, bool):
+            if need and not have:
+                return False
+        elif (have or 0) < need:
+            return False
+    return True
+
+
+def host_capacity(slots: int = 1) -> dict:
+    """What this host can offer each of ``slots`` concurrent jobs."""
+    cores = os.cpu_count() or 1
+    return {
+        "cores": max(1, cores // max(1, slots)),
+        "slots": slots,
+        "handbrake": shutil.which("HandBrakeCLI") is not None,
+        "ffmpeg": shutil.which("ffmpeg") is not None,
+    }
+
+
+class JobStore:
+    """The queue itself, on a SQLite file. Safe to share between threads
+    and, through SQLite's file locks, between processes on one host."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Default rollback journal, not WAL: WAL needs shared memory and
+        # does not work when the file sits on network storage
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _job(row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["requires"] = json.loads(job["requires"])
+        return job
+
+    def submit(
+        self,
+        kind: str,
+        payload: dict,
+        requires: dict | None = None,
+        priority: int = 0,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, payload, requires, priority, max_attempts,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    kind,
+                    json.dumps(payload, ensure_ascii=False),
+                    json.dumps(requires or {}),
+                    priority,
+                    max_attempts,
+                    now,
+                    now,
+                ),
+            )
+            return cursor.lastrowid
+
+    def claim(
+        self, worker: str, capacity: dict, kinds, lease: float = DEFAULT_LEASE
+    ) -> dict | None:
+        """Lease the highest-priority queued job this worker can run."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (name, capacity, last_seen)"
+                " VALUES (?, ?, ?)",
+                (worker, json.dumps(capacity), now),
+            )
+            self._expire_leases(conn, now)
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' AND not_before <= ?"
+                " ORDER BY priority DESC, id",
+                (now,),
+            ).fetchall()
+            for row in rows:
+                if row["kind"] in kinds and satisfies(
+                    capacity, json.loads(row["requires"])
+                ):
+                    conn.execute(
+                        "UPDATE jobs SET state = 'running', worker = ?,"
+                        " lease_until = ?, attempts = attempts + 1, updated = ?"
+                        " WHERE id = ?",
+                        (worker, now + lease, now, row["id"]),
+                    )
+                    job = self._job(row)
+                    job.update(state="running", worker=worker)
+                    job["attempts"] += 1
+                    return job
+        return None
+
+    @staticmethod
+    def _expire_leases(conn, now: float):
+        expired = conn.execute(
+            "SELECT id, worker, attempts, max_attempts FROM jobs"
+            " WHERE state = 'running' AND lease_until < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            state = "failed" if row["attempts"] >= row["max_attempts"] else "queued"
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL,"
+                " error = ?, updated = ? WHERE id = ?",
+                (state, f"lease expired on {row['worker']}", now, row["id"]),
+            )
+
+    def heartbeat(self, job_id: int, worker: str, lease: float = DEFAULT_LEASE) -> bool:
+        """Extend the lease; False if the job is no longer this worker's."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE workers SET last_seen = ? WHERE name = ?", (now, worker)
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ?"
+                " WHERE id = ? AND worker = ? AND state = 'running'",
+                (now + lease, now, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'done', lease_until = NULL, error = NULL,"
+                " updated = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (time.time(), job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """Record a failed attempt; the job is queued again after
+        ``RETRY_DELAY`` x attempts seconds unless it ran out of attempts."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND worker = ? AND state = 'running'",
+                (job_id, worker),
+            ).fetchone()
+            if row is None:
+                return False
+            state = "failed" if row["attempts"] >= row["max_attempts"] else "queued"
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL,"
+                " error = ?, not_before = ?, updated = ? WHERE id = ?",
+                (state, error, now + RETRY_DELAY * row["attempts"], now, job_id),
+            )
+            return True
+
+    def retry(self) -> int:
+        """Queue every failed job again with fresh attempts."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0,"
+                " updated = ? WHERE state = 'failed'",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+    def status(self) -> dict:
+        with self._lock:
+            counts = dict(
+                self._conn.execute(
+                    "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+                ).fetchall()
+            )
+            jobs = [
+                dict(row)
+                for row in self._conn.execute(
+                    "SELECT id, kind, state, attempts, max_attempts, worker, error"
+                    " FROM jobs WHERE state != 'done' ORDER BY id"
+                )
+            ]
+            workers = [
+                {**dict(row), "capacity": json.loads(row["capacity"])}
+                for row in self._conn.execute("SELECT * FROM workers ORDER BY name")
+            ]
+        return {"counts": counts, "jobs": jobs, "workers": workers}
+
+
+class QueueClient:
+    """Same methods as JobStore, over HTTP to a coordinator. Network errors
+    surface as OSError."""
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method: str, **kwargs):
+        request = urllib.request.Request(
+            f"{self.url}/{method}",
+            data=json.dumps(kwargs).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)["result"]
+        except urllib.error.HTTPError as e:
+            raise OSError(f"coordinator error {e.code}: {e.read().decode()}") from e
+
+    def __getattr__(self, method):
+        if method not in API_METHODS:
+            raise AttributeError(method)
+        return lambda **kwargs: self._call(method, **kwargs)
+
+
+def partial_path(path: Path) -> Path:
+    """Temporary name next to ``path`` for writing it, unique to this process
+    and thread. A job whose lease ran out may be running on two workers at
+    once; with their own partial files they only race on the final rename,
+    and both write the same result."""
+    return path.with_name(
+        f"{path.stem}.partial-{os.getpid()}-{threading.get_ident()}{path.suffix}"
+    )
+
+
+def open_queue(target: str):
+    """JobStore for a file path, QueueClient for an http(s) URL."""
+    if target.startswith(("http://", "https://")):
+        return QueueClient(target)
+    return JobStore(Path(target))
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """POST /<method> with the keyword arguments as a JSON object; replies
+    {"result": ...}. GET /status is the same as POST /status."""
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.strip("/") != "status":
+            self._reply(404, {"error": "not found"})
+            return
+        self._reply(200, {"result": self.server.store.status()})
+
+    def do_POST(self):
+        method = self.path.strip("/")
+        if method not in API_METHODS:
+            self._reply(404, {"error": f"unknown method {method}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            kwargs = json.loads(self.rfile.read(length) or b"{}")
+            result = getattr(self.server.store, method)(**kwargs)
+        except (TypeError, ValueError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except sqlite3.Error as e:
+            # e.g. "database is locked"; the client reports it and retries
+            self._reply(503, {"error": str(e)})
+            return
+        self._reply(200, {"result": result})
+
+    def log_message(self, format, *args):
+        # Workers poll every few seconds; keep the console for real news
+        pass
+
+
+def serve(store: JobStore, host: str, port: int):
+    server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.store = store
+    print(f"📡 Coordinator for {store.path} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_job(queue, job: dict, handler, worker: str, capacity: dict, lease: float):
+    """Run ``handler(payload, capacity)`` in a thread, renewing the lease
+    until it returns, then report the outcome."""
+    print(f"▶️  {worker}: job {job['id']} {job['kind']} (attempt {job['attempts']})")
+    outcome = {}
+
+    def target():
+        try:
+            handler(job["payload"], capacity)
+        except BaseException as e:
+            outcome["error"] = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+
+    thread = threading.Thread(target=target, name=f"job-{job['id']}", daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    lost = False
+    while thread.is_alive():
+        thread.join(max(1.0, lease / 4))
+        if thread.is_alive() and not lost:
+            try:
+                lost = not queue.heartbeat(job_id=job["id"], worker=worker, lease=lease)
+            except QUEUE_ERRORS as e:
+                print(f"⚠️  {worker}: heartbeat failed ({e})")
+            if lost:
+                # The job may now run on another worker as well. Outputs are
+                # written under per-process partial names and renamed into
+                # place, so the two runs cannot corrupt each other's files;
+                # only the worker holding the lease can complete it.
+                print(f"⚠️  {worker}: lost the lease on job {job['id']}")
+
+    elapsed = time.perf_counter() - started
+    try:
+        if "error" in outcome:
+            queue.fail(job_id=job["id"], worker=worker, error=outcome["error"])
+            print(f"❌ {worker}: job {job['id']} failed ({outcome['error']})")
+        elif queue.complete(job_id=job["id"], worker=worker):
+            print(f"✅ {worker}: job {job['id']} done ({elapsed:.1f}s)")
+        else:
+            print(f"⚠️  {worker}: job {job['id']} finished after its lease ran out")
+    except QUEUE_ERRORS as e:
+        # The lease will run out and the job is handed out again
+        print(f"⚠️  {worker}: could not report job {job['id']} ({e})")
+
+
+def run_worker(
+    queue,
+    handlers: dict,
+    name: str | None = None,
+    slots: int = 1,
+    lease: float = DEFAULT_LEASE,
+    poll: float = DEFAULT_POLL,
+    once: bool = False,
+):
+    """Claim and run jobs of the kinds in ``handlers`` on ``slots`` threads
+    until interrupted (or, with ``once``, until the queue has nothing left
+    for this worker)."""
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    capacity = host_capacity(slots)
+    stop = threading.Event()
+    print(f"🛠️  Worker {name}: {slots} slot(s), capacity {capacity}")
+
+    def slot(worker: str):
+        while not stop.is_set():
+            try:
+                job = queue.claim(
+                    worker=worker, capacity=capacity, kinds=list(handlers), lease=lease
+                )
+            except QUEUE_ERRORS as e:
+                print(f"⚠️  {worker}: queue unavailable ({e})")
+                stop.wait(poll)
+                continue
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll)
+                continue
+            run_job(queue, job, handlers[job["kind"]], worker, capacity, lease)
+
+    threads = [
+        threading.Thread(
+            target=slot, args=(f"{name}/{n}" if slots > 1 else name,), daemon=True
+        )
+        for n in range(slots)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1.0)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Worker {name}: finishing running jobs (Ctrl+C again to abort)")
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def worker_main(argv, handlers: dict, description: str):
+    """Command line for the ``worker`` subcommand of the conversion scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("queue", help="Queue database file or coordinator URL")
+    parser.add_argument("--name", help="Worker name (default: host-pid)")
+    parser.add_argument(
+        "--slots", type=int, default=1, help="Jobs to run at the same time"
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=DEFAULT_LEASE,
+        help=f"Seconds a claim is valid without a heartbeat (default: {DEFAULT_LEASE})",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=DEFAULT_POLL,
+        help=f"Seconds between claims when the queue is empty (default: {DEFAULT_POLL})",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Exit when no job is left for this worker"
+    )
+    parser.add_argument("--events", type=Path, help="Append a JSON line per timed step")
+    parser.add_argument(
+        "--timings", action="store_true", help="Print per-stage totals on exit"
+    )
+    args = parser.parse_args(argv)
+
+    instrumentation.configure(args.events, args.timings)
+    try:
+        queue = open_queue(args.queue)
+    except QUEUE_ERRORS as e:
+        print(f"❌ Queue unavailable: {e}")
+        sys.exit(1)
+    run_worker(
+        queue,
+        handlers,
+        args.name,
+        max(1, args.slots),
+        args.lease,
+        args.poll,
+        args.once,
+    )
+    instrumentation.summary()
+
+
+def print_status(status: dict):
+    counts = status["counts"]
+    print(
+        "Jobs: "
+        + ", ".join(
+            f"{counts.get(state, 0)} {state}"
+            for state in ("queued", "running", "done", "failed")
+        )
+    )
+    for job in status["jobs"]:
+        line = (
+            f"  #{job['id']:<5} {job['kind']:<14} {job['state']:<8}"
+            f" {job['attempts']}/{job['max_attempts']}"
+        )
+        if job["worker"]:
+            line += f"  on {job['worker']}"
+        if job["error"]:
+            line += f"  ({job['error']})"
+        print(line)
+    now = time.time()
+    for worker in status["workers"]:
+        capacity = worker["capacity"]
+        print(
+            f"  worker {worker['name']}: {capacity.get('cores')} cores,"
+            f" handbrake={'yes' if capacity.get('handbrake') else 'no'},"
+            f" seen {now - worker['last_seen']:.0f}s ago"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Shared conversion job queue: coordinator and status."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Run the HTTP coordinator")
+    serve_parser.add_argument("--db", type=Path, default=Path("queue.sqlite"))
+    serve_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on; use 0.0.0.0 for other hosts on a trusted network",
+    )
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    status_parser = commands.add_parser("status", help="Show queued/failed jobs")
+    status_parser.add_argument("queue", help="Queue database file or coordinator URL")
+    retry_parser = commands.add_parser("retry", help="Queue failed jobs again")
+    retry_parser.add_argument("queue", help="Queue database file or coordinator URL")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(JobStore(args.db), args.host, args.port)
+        return
+
+    try:
+        queue = open_queue(args.queue)
+        if args.command == "status":
+            print_status(queue.status())
+        else:
+            print(f"🔁 {queue.retry()} failed job(s) queued again")
+    except QUEUE_ERRORS as e:
+        print(f"❌ Queue unavailable: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+MANIFEST_NAME = ".convert_manifest.json"
+MANIFEST_VERSION = 2
+# Version 1 keyed entries by output file name instead of relative path
+LEGACY_NAME_KEYS_VERSION = 1
+
+
+def _digest(value) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def file_signature(path: Path | None) -> dict | None:
+    if path is None:
+        return None
+    st = path.stat()
+    return {"path": str(path.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class ConversionManifest:
+    """Per-output-folder record of what each MP3 was built from.
+
+    Each entry is keyed by the output path relative to the manifest and
+    stores a digest of the source file signature + encoder settings and a
+    digest of the tag inputs, so a re-run can tell whether a track needs a
+    full encode, only a re-tag, or nothing at all.
+
+    Version 1 manifests (keyed by file name) are still read: an output with
+    no entry of its own falls back to the entry under its file name, and is
+    stored under its relative path from then on.
+    """
+
+    def __init__(self, output_dir: Path, force: bool = False):
+        self.path = output_dir / MANIFEST_NAME
+        self.force = force
+        self._lock = threading.Lock()
+        self._tracks = {}
+        self._legacy = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self._tracks = data.get("tracks", {})
+                elif data.get("version") == LEGACY_NAME_KEYS_VERSION:
+                    self._legacy = data.get("tracks", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable manifest {self.path}: {e}")
+
+    def _entry_key(self, output_path: Path) -> str:
+        return Path(os.path.relpath(output_path, self.path.parent)).as_posix()
+
+    @staticmethod
+    def _encode_key(source: Path, encode_settings) -> str:
+        return _digest({"source": file_signature(source), "settings": encode_settings})
+
+    @staticmethod
+    def _tag_key(tag_info, cover) -> str:
+        cover_key = None
+        if cover is not None:
+            cover_key = {"file": file_signature(cover.path), "bytes": len(cover.data)}
+        return _digest({"tags": tag_info, "cover": cover_key})
+
+    def plan(
+        self, output_path: Path, source: Path, encode_settings, tag_info, cover=None
+    ) -> str:
+        """Return "encode", "tag" or "skip" for one output track."""
+        if self.force or not output_path.exists():
+            return "encode"
+
+        with self._lock:
+            entry = self._tracks.get(self._entry_key(output_path))
+            if entry is None:
+                # A name shared by two albums only costs a re-encode: the
+                # encode digest includes the resolved source path
+                entry = self._legacy.get(output_path.name)
+                if entry is not None:
+                    self._tracks[self._entry_key(output_path)] = entry
+        encode_key = self._encode_key(source, encode_settings)
+        if not entry or entry.get("encode") != encode_key:
+            return "encode"
+        if entry.get("tags") != self._tag_key(tag_info, cover):
+            return "tag"
+        return "skip"
+
+    def record(
+        self, output_path: Path, source: Path, encode_settings, tag_info, cover=None
+    ):
+        entry = {
+            "source": str(source),
+            "encode": self._encode_key(source, encode_settings),
+            "tags": self._tag_key(tag_info, cover),
+        }
+        with self._lock:
+            self._tracks[self._entry_key(output_path)] = entry
+
+    def save(self):
+        with self._lock:
+            data = {"version": MANIFEST_VERSION, "tracks": self._tracks}
+            # Another worker may be saving the same manifest (see
+            # job_queue.partial_path); each writes its own temporary file
+            tmp_path = self.path.with_name(
+                f"{self.path.name}.{os.getpid()}-{threading.get_ident()}.tmp"
+            )
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
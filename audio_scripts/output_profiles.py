@@ -0,0 +1,114 @@
+"""Output formats for ``convert_flac_mp3.py``.
+
+A profile names a codec, its main setting (quality, bitrate or compression
+level) and what the container can hold. Profiles are chosen on the command
+line as ``name[:setting]``, e.g. ``mp3``, ``mp3:320k``, ``opus:96k`` or
+``flac:8``; every profile writes to its own ``output_<name>/`` folder.
+"""
+
+import re
+from dataclasses import dataclass, replace
+
+BITRATE_RE = re.compile(r"\d+k")
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    name: str
+    extension: str
+    codec: str
+    option: str
+    setting: str
+    # Container takes an attached picture (the front cover)
+    cover: bool = True
+    lossless: bool = False
+    muxer_args: tuple = ()
+    # Valid values of ``option`` when it is not a bitrate
+    levels: range | None = None
+
+    @property
+    def output_dir_name(self) -> str:
+        return f"output_{self.name}"
+
+    def with_setting(self, setting: str) -> "OutputProfile":
+        """Copy with another setting; raises ValueError for a setting the
+        codec would misread, such as a bitrate without its ``k``."""
+        setting = setting.strip().lower()
+        if BITRATE_RE.fullmatch(setting) and not self.lossless:
+            return replace(self, setting=setting)
+        if (
+            self.levels is not None
+            and setting.isdigit()
+            and int(setting) in self.levels
+        ):
+            return replace(self, setting=setting)
+        if self.levels is None:
+            expected = "a bitrate like 96k"
+        else:
+            expected = f"{self.levels.start}-{self.levels.stop - 1}"
+            if self.option == "-qscale:a":
+                expected += " or a bitrate like 320k"
+        raise ValueError(
+            f"Invalid {self.name} setting '{setting}' (expected {expected})"
+        )
+
+    def encoder_args(self, bits_per_sample: int | None = None) -> list[str]:
+        """``-codec:a`` plus the profile setting; a setting like ``320k`` is
+        always a bitrate. For lossless profiles ``bits_per_sample`` keeps
+        24-bit sources at 24 bits instead of the decoder's 32-bit samples."""
+        option = "-b:a" if self.setting.lower().endswith("k") else self.option
+        args = ["-codec:a", self.codec, option, self.setting]
+        if self.lossless and bits_per_sample and bits_per_sample > 16:
+            args += ["-bits_per_raw_sample", str(bits_per_sample)]
+        return args
+
+
+PROFILES = {
+    # Same arguments as the original MP3-only script, so existing manifests
+    # stay valid
+    "mp3": OutputProfile(
+        "mp3",
+        ".mp3",
+        "libmp3lame",
+        "-qscale:a",
+        "2",
+        muxer_args=("-id3v2_version", "3"),
+        levels=range(10),
+    ),
+    # The ogg muxer cannot store an attached picture
+    "opus": OutputProfile("opus", ".opus", "libopus", "-b:a", "128k", cover=False),
+    "aac": OutputProfile("aac", ".m4a", "aac", "-b:a", "256k"),
+    "flac": OutputProfile(
+        "flac",
+        ".flac",
+        "flac",
+        "-compression_level",
+        "5",
+        lossless=True,
+        levels=range(13),
+    ),
+}
+DEFAULT_PROFILES = "mp3"
+
+
+def parse_profile(spec: str) -> OutputProfile:
+    """``name[:setting]`` -> OutputProfile; raises ValueError."""
+    name, _, setting = spec.strip().partition(":")
+    profile = PROFILES.get(name.lower())
+    if profile is None:
+        raise ValueError(
+            f"Unknown output format '{name}' (choose from {', '.join(PROFILES)})"
+        )
+    return profile.with_setting(setting) if setting else profile
+
+
+def parse_profiles(specs: str) -> list[OutputProfile]:
+    """Comma-separated profile list, one profile per format."""
+    profiles = {}
+    for spec in specs.split(","):
+        if spec.strip():
+            profile = parse_profile(spec)
+            profiles[profile.name] = profile
+    if not profiles:
+        raise ValueError("No output format given")
+    return list(profiles.values())
@@ -0,0 +1,101 @@
+from cuesheet import cuesheet_to_info, decode_cue_bytes, parse_cuesheet, tokenize_line
+
+MULTI_FILE_CUE = """\
+REM GENRE "Jazz"
+REM DATE 1998
+REM DATE 2004
+PERFORMER "The Band"
+TITLE "Live at the Club"
+FILE "Disc 1.flac" WAVE
+  TRACK 01 AUDIO
+    TITLE "Intro"
+    INDEX 01 00:00:00
+  TRACK 02 AUDIO
+    TITLE "Second Song"
+    PERFORMER "Guest Singer"
+    INDEX 00 04:10:50
+    INDEX 01 04:12:00
+FILE "Disc 2.flac" WAVE
+  TRACK 03 AUDIO
+    TITLE "Opener, Part 2"
+    INDEX 01 00:00:00
+  TRACK 04 AUDIO
+    INDEX 01 03:05:72
+"""
+
+
+def test_tokenize_quoted_and_bare():
+    assert tokenize_line('TITLE "Hello  World"') == ["TITLE", "Hello  World"]
+    assert tokenize_line('FILE "a b.flac" WAVE') == ["FILE", "a b.flac", "WAVE"]
+    assert tokenize_line('TITLE ""') == ["TITLE", ""]
+    # An unterminated quote runs to the end of the line
+    assert tokenize_line('TITLE "Open ended') == ["TITLE", "Open ended"]
+
+
+def test_unquoted_fields_are_joined():
+    sheet = parse_cuesheet("TITLE Some Album\nTRACK 1 AUDIO\nTITLE Bare words\n")
+    assert sheet["title"] == "Some Album"
+    assert sheet["tracks"][0]["title"] == "Bare words"
+
+
+def test_album_and_track_fields():
+    sheet = parse_cuesheet(MULTI_FILE_CUE)
+    assert sheet["title"] == "Live at the Club"
+    assert sheet["performer"] == "The Band"
+    # The first REM of a kind wins
+    assert sheet["rem"] == {"GENRE": "Jazz", "DATE": "1998"}
+    assert sheet["files"] == ["Disc 1.flac", "Disc 2.flac"]
+    second = sheet["tracks"][1]
+    assert second["performer"] == "Guest Singer"
+    assert second["index"] == {0: "04:10:50", 1: "04:12:00"}
+
+
+def test_index_offsets_are_per_file():
+    info = cuesheet_to_info(parse_cuesheet(MULTI_FILE_CUE))
+    assert [(t["track"], t.get("file"), t["start"]) for t in info["tracks"]] == [
+        (1, "Disc 1.flac", "00:00:00"),
+        (2, "Disc 1.flac", "04:12:00"),
+        (3, "Disc 2.flac", "00:00:00"),
+        (4, "Disc 2.flac", "03:05:72"),
+    ]
+    assert info["tracks"][1]["pregap"] == "04:10:50"
+    assert info["tracks"][1]["performer"] == "Guest Singer"
+    assert "performer" not in info["tracks"][0]
+    assert info["tracks"][3]["title"] == "Track 04"
+
+
+def test_single_file_tracks_have_no_file_key():
+    text = 'FILE "image.flac" WAVE\nTRACK 01 AUDIO\nINDEX 01 00:00:00\n'
+    info = cuesheet_to_info(parse_cuesheet(text))
+    assert "file" not in info["tracks"][0]
+
+
+def test_tags_override_cue_fields():
+    info = cuesheet_to_info(
+        parse_cuesheet(MULTI_FILE_CUE), {"album": "Tagged", "date": "2001-05-01"}
+    )
+    assert info["album"] == "Tagged"
+    assert info["album_artist"] == "The Band"
+    assert info["genre"] == "Jazz"
+    assert info["year"] == "2001"
+
+
+def test_malformed_lines_are_skipped():
+    text = (
+        "TRACK xx AUDIO\nTITLE Orphan\nINDEX 01 00:00:00\n"
+        "TRACK 02 AUDIO\nINDEX aa 00:01:00\nINDEX 01\nINDEX 01 00:02:00\n"
+    )
+    sheet = parse_cuesheet(text)
+    assert [t["track"] for t in sheet["tracks"]] == [2]
+    assert sheet["tracks"][0]["index"] == {1: "00:02:00"}
+    # A TITLE after an unparsable TRACK belongs to the album
+    assert sheet["title"] == "Orphan"
+    assert cuesheet_to_info(parse_cuesheet("TRACK 01 AUDIO\n"))["tracks"] == []
+
+
+def test_decode_cue_bytes():
+    assert decode_cue_bytes('TITLE "Ä"'.encode("utf-8-sig")) == 'TITLE "Ä"'
+    assert decode_cue_bytes('TITLE "Ä"'.encode("utf-16")) == 'TITLE "Ä"'
+    # Not UTF-8: falls back to the legacy code pages
+    assert decode_cue_bytes(b"caf\xe9") == "café"
+    assert decode_cue_bytes(b"caf\xe9", "latin-1") == "café"
@@ -0,0 +1,156 @@
+import struct
+
+import pytest
+
+from flac_meta import FlacFormatError, front_cover, read_flac_metadata
+
+STREAMINFO = 0
+VORBIS_COMMENT = 4
+PADDING = 1
+PICTURE = 6
+
+
+def block(block_type, data, last=False, length=None):
+    length = len(data) if length is None else length
+    return (
+        bytes([block_type | (0x80 if last else 0)]) + length.to_bytes(3, "big") + data
+    )
+
+
+def streaminfo(sample_rate=44100, channels=2, bits=16, total_samples=1_000_000):
+    packed = (
+        (sample_rate << 44)
+        | ((channels - 1) << 41)
+        | ((bits - 1) << 36)
+        | total_samples
+    )
+    return bytes(10) + packed.to_bytes(8, "big") + bytes(16)
+
+
+def vorbis_comment(*entries, vendor=b"reference libFLAC"):
+    data = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(entries))
+    for entry in entries:
+        raw = entry.encode("utf-8")
+        data += struct.pack("<I", len(raw)) + raw
+    return data
+
+
+def picture(picture_type=3, mime=b"image/jpeg", image=b"\xff\xd8jpeg", data_len=None):
+    data_len = len(image) if data_len is None else data_len
+    return (
+        struct.pack(">II", picture_type, len(mime))
+        + mime
+        + struct.pack(">I", 0)
+        + struct.pack(">IIIII", 500, 400, 24, 0, data_len)
+        + image
+    )
+
+
+def write_flac(tmp_path, *blocks, prefix=b""):
+    path = tmp_path / "test.flac"
+    path.write_bytes(prefix + b"fLaC" + b"".join(blocks) + b"\xff\xf8audio")
+    return path
+
+
+def test_streaminfo_and_tags(tmp_path):
+    path = write_flac(
+        tmp_path,
+        block(STREAMINFO, streaminfo(96000, 2, 24, 123456789)),
+        block(PADDING, bytes(32)),
+        block(
+            VORBIS_COMMENT,
+            vorbis_comment(
+                "TITLE=Song",
+                "AlbumArtist=Someone",
+                "TRACKNUMBER=3",
+                "ARTIST=A",
+                "artist=B",
+                "no separator",
+            ),
+            last=True,
+        ),
+    )
+    meta = read_flac_metadata(path)
+    assert meta["streaminfo"] == {
+        "sample_rate": 96000,
+        "channels": 2,
+        "bits_per_sample": 24,
+        "total_samples": 123456789,
+    }
+    assert meta["tags"] == {
+        "title": "Song",
+        "album_artist": "Someone",
+        "track": "3",
+        "artist": "A;B",
+    }
+    assert meta["pictures"] == []
+
+
+def test_id3v2_prefix_is_skipped(tmp_path):
+    id3 = b"ID3\x03\x00\x00" + bytes([0, 0, 0, 10]) + bytes(10)
+    path = write_flac(tmp_path, block(STREAMINFO, streaminfo(), last=True), prefix=id3)
+    assert read_flac_metadata(path)["streaminfo"]["sample_rate"] == 44100
+
+
+def test_pictures_only_when_asked(tmp_path):
+    path = write_flac(
+        tmp_path,
+        block(STREAMINFO, streaminfo()),
+        block(PICTURE, picture(picture_type=0, image=b"other")),
+        block(PICTURE, picture(), last=True),
+    )
+    assert read_flac_metadata(path)["pictures"] == []
+    pictures = read_flac_metadata(path, pictures=True)["pictures"]
+    assert [p["type"] for p in pictures] == [0, 3]
+    cover = front_cover(pictures)
+    assert cover["mime"] == "image/jpeg"
+    assert (cover["width"], cover["height"]) == (500, 400)
+    assert cover["data"] == b"\xff\xd8jpeg"
+
+
+def test_front_cover_falls_back_to_first_picture():
+    assert front_cover([]) is None
+    assert front_cover([{"type": 0}, {"type": 4}]) == {"type": 0}
+
+
+def test_not_flac(tmp_path):
+    path = tmp_path / "test.flac"
+    path.write_bytes(b"RIFF....WAVE")
+    with pytest.raises(FlacFormatError):
+        read_flac_metadata(path)
+
+
+def test_missing_last_block(tmp_path):
+    path = tmp_path / "test.flac"
+    path.write_bytes(b"fLaC" + block(STREAMINFO, streaminfo()))
+    with pytest.raises(FlacFormatError):
+        read_flac_metadata(path)
+
+
+@pytest.mark.parametrize(
+    "blocks",
+    [
+        # Header claims more bytes than the file has
+        [
+            block(STREAMINFO, streaminfo()),
+            block(VORBIS_COMMENT, b"\x00" * 8, last=True, length=4096),
+        ],
+        [block(STREAMINFO, streaminfo()[:10], last=True)],
+        [block(VORBIS_COMMENT, vorbis_comment("TITLE=x")[:-3], last=True)],
+        # Entry/picture lengths that run past their block
+        [
+            block(
+                VORBIS_COMMENT,
+                vorbis_comment()[:-4] + struct.pack("<II", 1, 99) + b"TITLE=x",
+                last=True,
+            )
+        ],
+        [block(PICTURE, picture(data_len=1 << 20), last=True)],
+        [block(PICTURE, picture()[:12], last=True)],
+    ],
+)
+def test_truncated_or_oversized_blocks(tmp_path, blocks):
+    path = tmp_path / "test.flac"
+    path.write_bytes(b"fLaC" + b"".join(blocks))
+    with pytest.raises(FlacFormatError):
+        read_flac_metadata(path, pictures=True)
@@ -0,0 +1,122 @@
+from convert_flac_mp3 import (
+    itunsmpb_from_lame,
+    plan_track_outputs,
+    read_lame_info,
+    record_outputs,
+)
+from manifest import ConversionManifest
+from output_profiles import PROFILES
+
+
+def info_frame(header, side_info, frames, delay, padding, encoder=b"Lavc60.31"):
+    """First frame of an MP3 as written by ffmpeg's mp3 muxer: Info tag with
+    frame/byte counts, TOC and quality, then the LAME-style extension."""
+    return (
+        header
+        + bytes(side_info)
+        + b"Info"
+        + (0x0F).to_bytes(4, "big")
+        + frames.to_bytes(4, "big")
+        + (123456).to_bytes(4, "big")
+        + bytes(100)
+        + bytes(4)
+        + encoder.ljust(9, b"\0")
+        + bytes(12)
+        + (delay << 12 | padding).to_bytes(3, "big")
+        + bytes(200)
+    )
+
+
+def id3_tag(body=b"TIT2" + bytes(20)):
+    size = len(body)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x03\x00\x00" + syncsafe + body
+
+
+def write_mp3(tmp_path, data):
+    path = tmp_path / "track.mp3"
+    path.write_bytes(data)
+    return path
+
+
+def test_ffmpeg_info_frame(tmp_path):
+    # MPEG-1 layer III, 44.1 kHz, joint stereo
+    frame = info_frame(b"\xff\xfb\x90\x64", 32, frames=100, delay=576, padding=1000)
+    lame = read_lame_info(write_mp3(tmp_path, id3_tag() + frame))
+    assert lame == {
+        "frames": 100,
+        "sample_rate": 44100,
+        "encoder_delay": 576,
+        "encoder_padding": 1000,
+    }
+    # 100 * 1152 - 576 - 1000 = 113624 source samples
+    assert itunsmpb_from_lame(lame) == (
+        " 00000000 00000451 000001D7 000000000001BBD8"
+        " 00000000 00000000 00000000 00000000"
+        " 00000000 00000000 00000000 00000000"
+    )
+
+
+def test_lame_info_frame(tmp_path):
+    frame = info_frame(
+        b"\xff\xfb\x90\x64",
+        32,
+        frames=10,
+        delay=576,
+        padding=1200,
+        encoder=b"LAME3.100",
+    )
+    lame = read_lame_info(write_mp3(tmp_path, frame))
+    assert (lame["encoder_delay"], lame["encoder_padding"]) == (576, 1200)
+
+
+def test_padding_below_decoder_delay_keeps_exact_length(tmp_path):
+    frame = info_frame(b"\xff\xfb\x90\x64", 32, frames=100, delay=576, padding=300)
+    fields = itunsmpb_from_lame(read_lame_info(write_mp3(tmp_path, frame))).split()
+    assert int(fields[1], 16) == 576 + 529
+    assert int(fields[2], 16) == 0
+    assert int(fields[3], 16) == 100 * 1152 - 576 - 300
+
+
+def test_mpeg2_mono(tmp_path):
+    # MPEG-2 layer III, 22.05 kHz, mono: 9 bytes of side info, 576 samples a frame
+    frame = info_frame(b"\xff\xf3\x60\xc4", 9, frames=50, delay=576, padding=600)
+    lame = read_lame_info(write_mp3(tmp_path, frame))
+    assert lame["sample_rate"] == 22050
+    fields = itunsmpb_from_lame(lame).split()
+    assert int(fields[3], 16) == 50 * 576 - 576 - 600
+
+
+def test_no_info_frame(tmp_path):
+    plain = b"\xff\xfb\x90\x64" + bytes(400)
+    assert read_lame_info(write_mp3(tmp_path, plain)) is None
+    assert read_lame_info(write_mp3(tmp_path, b"not an mp3")) is None
+    assert itunsmpb_from_lame(None) is None
+
+
+def test_gapless_change_re_encodes(tmp_path):
+    source = tmp_path / "image.flac"
+    source.write_bytes(b"flac")
+    out_dir = tmp_path / "output_mp3"
+    out_dir.mkdir()
+    (out_dir / "01.One.mp3").write_bytes(b"mp3")
+    targets = [(PROFILES["mp3"], out_dir, ConversionManifest(out_dir))]
+    tag_info = {"title": "One"}
+    cut = {"start": 0.0, "end": 60.0}
+
+    record_outputs(
+        plan_track_outputs(targets, "01.One", source, cut, tag_info), tag_info, source
+    )
+    assert plan_track_outputs(targets, "01.One", source, cut, tag_info) == []
+
+    # The flag itself is not a tag: it does not trigger a re-tag on its own
+    assert (
+        plan_track_outputs(targets, "01.One", source, cut, dict(tag_info, gapless=True))
+        == []
+    )
+    # --gapless cuts at other boundaries: a full encode, not just new tags
+    gapless_cut = dict(cut, single_decode=True, gapless=True)
+    outputs = plan_track_outputs(
+        targets, "01.One", source, gapless_cut, dict(tag_info, gapless=True)
+    )
+    assert [o.encode for o in outputs] == [True]
@@ -0,0 +1,129 @@
+import types
+
+import pytest
+
+import job_queue
+from job_queue import JobStore
+
+WORKER = {"cores": 8, "handbrake": True, "ffmpeg": True}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(job_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return JobStore(tmp_path / "queue.sqlite")
+
+
+def job_state(store, job_id):
+    return next(j for j in store.status()["jobs"] if j["id"] == job_id)
+
+
+def test_expired_lease_goes_back_to_queue(store, clock):
+    job_id = store.submit("transcode", {"path": "a.mkv"})
+    assert store.claim("w1", WORKER, ["transcode"], lease=60)["id"] == job_id
+    assert store.claim("w2", WORKER, ["transcode"], lease=60) is None
+
+    clock.now += 61
+    job = store.claim("w2", WORKER, ["transcode"], lease=60)
+    assert job["id"] == job_id
+    assert job["worker"] == "w2"
+    assert job["attempts"] == 2
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(store, clock):
+    job_id = store.submit("transcode", {}, max_attempts=1)
+    store.claim("w1", WORKER, ["transcode"], lease=60)
+
+    clock.now += 61
+    assert store.claim("w2", WORKER, ["transcode"]) is None
+    job = job_state(store, job_id)
+    assert job["state"] == "failed"
+    assert job["error"] == "lease expired on w1"
+
+
+def test_fail_retries_with_delay_until_max_attempts(store, clock):
+    job_id = store.submit("transcode", {}, max_attempts=2)
+    store.claim("w1", WORKER, ["transcode"])
+    assert store.fail(job_id, "w1", "boom")
+    assert job_state(store, job_id)["state"] == "queued"
+
+    # Not handed out again before the retry delay has passed
+    assert store.claim("w1", WORKER, ["transcode"]) is None
+    clock.now += job_queue.RETRY_DELAY
+    assert store.claim("w1", WORKER, ["transcode"])["attempts"] == 2
+
+    assert store.fail(job_id, "w1", "boom again")
+    job = job_state(store, job_id)
+    assert job["state"] == "failed"
+    assert job["error"] == "boom again"
+    clock.now += 10 * job_queue.RETRY_DELAY
+    assert store.claim("w1", WORKER, ["transcode"]) is None
+
+
+def test_worker_that_lost_its_lease_cannot_finish(store, clock):
+    job_id = store.submit("transcode", {})
+    store.claim("w1", WORKER, ["transcode"], lease=60)
+    clock.now += 61
+    store.claim("w2", WORKER, ["transcode"], lease=60)
+
+    assert not store.heartbeat(job_id, "w1")
+    assert not store.complete(job_id, "w1")
+    assert not store.fail(job_id, "w1", "late")
+    assert store.heartbeat(job_id, "w2")
+    assert store.complete(job_id, "w2")
+    assert store.status()["counts"] == {"done": 1}
+
+
+def test_heartbeat_keeps_the_lease(store, clock):
+    job_id = store.submit("transcode", {})
+    store.claim("w1", WORKER, ["transcode"], lease=60)
+    clock.now += 50
+    assert store.heartbeat(job_id, "w1", lease=60)
+    clock.now += 50
+    assert store.claim("w2", WORKER, ["transcode"]) is None
+    assert store.complete(job_id, "w1")
+
+
+def test_claim_matches_kind_and_requirements(store):
+    transcode = store.submit("transcode", {}, requires={"handbrake": True, "cores": 4})
+    remux = store.submit("remux", {}, requires={"ffmpeg": True})
+
+    no_handbrake = {"cores": 16, "handbrake": False, "ffmpeg": True}
+    assert store.claim("small", no_handbrake, ["transcode"]) is None
+    assert store.claim("small", no_handbrake, ["transcode", "remux"])["id"] == remux
+
+    few_cores = {"cores": 2, "handbrake": True, "ffmpeg": True}
+    assert store.claim("tiny", few_cores, ["transcode"]) is None
+    assert store.claim("big", WORKER, ["remux"]) is None
+    assert store.claim("big", WORKER, ["transcode"])["id"] == transcode
+
+
+def test_claim_by_priority_then_submission_order(store):
+    low = store.submit("transcode", {}, priority=1)
+    high = store.submit("transcode", {}, priority=10)
+    also_high = store.submit("transcode", {}, priority=10)
+
+    claimed = [store.claim("w", WORKER, ["transcode"])["id"] for _ in range(3)]
+    assert claimed == [high, also_high, low]
+
+
+def test_retry_requeues_failed_jobs_with_fresh_attempts(store, clock):
+    job_id = store.submit("transcode", {}, max_attempts=1)
+    done_id = store.submit("transcode", {}, priority=-1)
+    store.claim("w1", WORKER, ["transcode"])
+    store.fail(job_id, "w1", "boom")
+    store.claim("w1", WORKER, ["transcode"])
+    store.complete(done_id, "w1")
+
+    assert store.retry() == 1
+    job = store.claim("w1", WORKER, ["transcode"])
+    assert job["id"] == job_id
+    assert job["attempts"] == 1
+    assert store.status()["counts"] == {"running": 1, "done": 1}
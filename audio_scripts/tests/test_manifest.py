@@ -0,0 +1,49 @@
+import json
+
+from manifest import MANIFEST_NAME, MANIFEST_VERSION, ConversionManifest
+
+SETTINGS = {"codec": "libmp3lame"}
+TAGS = {"title": "One"}
+
+
+def test_version_1_entries_are_migrated(tmp_path):
+    source = tmp_path / "album.flac"
+    source.write_bytes(b"flac")
+    output_dir = tmp_path / "output_mp3"
+    output = output_dir / "Album" / "01.One.mp3"
+    output.parent.mkdir(parents=True)
+    output.write_bytes(b"mp3")
+
+    current = ConversionManifest(output_dir)
+    current.record(output, source, SETTINGS, TAGS)
+    entry = current._tracks["Album/01.One.mp3"]
+    (output_dir / MANIFEST_NAME).write_text(
+        json.dumps({"version": 1, "tracks": {"01.One.mp3": entry}})
+    )
+
+    manifest = ConversionManifest(output_dir)
+    assert manifest.plan(output, source, SETTINGS, TAGS) == "skip"
+    assert manifest.plan(output, source, SETTINGS, {"title": "Two"}) == "tag"
+    manifest.save()
+
+    data = json.loads((output_dir / MANIFEST_NAME).read_text())
+    assert data["version"] == MANIFEST_VERSION
+    assert list(data["tracks"]) == ["Album/01.One.mp3"]
+    assert ConversionManifest(output_dir).plan(output, source, SETTINGS, TAGS) == "skip"
+
+
+def test_legacy_entry_of_another_source_is_re_encoded(tmp_path):
+    other = tmp_path / "other.flac"
+    other.write_bytes(b"other")
+    source = tmp_path / "album.flac"
+    source.write_bytes(b"flac")
+    output = tmp_path / "A" / "01.mp3"
+    output.parent.mkdir()
+    output.write_bytes(b"mp3")
+
+    legacy = ConversionManifest(tmp_path)
+    legacy.record(output, other, SETTINGS, TAGS)
+    (tmp_path / MANIFEST_NAME).write_text(
+        json.dumps({"version": 1, "tracks": {"01.mp3": legacy._tracks["A/01.mp3"]}})
+    )
+    assert ConversionManifest(tmp_path).plan(output, source, SETTINGS, TAGS) == "encode"
@@ -0,0 +1,47 @@
+import pytest
+
+from output_profiles import parse_profile, parse_profiles
+
+
+@pytest.mark.parametrize(
+    "spec, setting",
+    [
+        ("mp3", "2"),
+        ("mp3:0", "0"),
+        ("mp3:320K", "320k"),
+        ("opus:96k", "96k"),
+        ("flac:8", "8"),
+    ],
+)
+def test_valid_settings(spec, setting):
+    assert parse_profile(spec).setting == setting
+
+
+@pytest.mark.parametrize(
+    "spec", ["aac:5", "opus:96", "mp3:10", "mp3:v2", "flac:13", "flac:96k", "wav"]
+)
+def test_invalid_settings(spec):
+    with pytest.raises(ValueError):
+        parse_profile(spec)
+
+
+def test_encoder_args():
+    assert parse_profile("mp3:320k").encoder_args() == [
+        "-codec:a",
+        "libmp3lame",
+        "-b:a",
+        "320k",
+    ]
+    assert parse_profile("flac").encoder_args(24) == [
+        "-codec:a",
+        "flac",
+        "-compression_level",
+        "5",
+        "-bits_per_raw_sample",
+        "24",
+    ]
+
+
+def test_one_profile_per_format():
+    profiles = parse_profiles("mp3, opus:96k, mp3:0")
+    assert [(p.name, p.setting) for p in profiles] == [("mp3", "0"), ("opus", "96k")]
@@ -0,0 +1,414 @@
+import argparse
+import heapq
+import itertools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+import instrumentation
+from convert_flac_mp3 import DEFAULT_JOBS, convert_cue_flac, convert_flac_folder
+from cover_art import COVER_EXTENSIONS, COVER_NAMES, CoverCache
+from extract_metadata import collect_albums, extract_album
+from inotify_watch import Inotify
+from output_profiles import DEFAULT_PROFILES, PROFILES, parse_profiles
+
+DEFAULT_SETTLE = 3.0
+# Lower runs first: finish albums already in the pipeline before starting
+# new ones, so each album shows up as soon as possible
+STAGE_PRIORITY = {"retag": 0, "convert": 1, "extract": 2}
+
+
+def album_snapshot(album_dir: Path) -> tuple[tuple, tuple]:
+    """(audio, metadata) signatures of an album folder.
+
+    Each is a tuple of (relative path, size, mtime) for the FLAC/CUE files
+    anywhere below ``album_dir`` and for its info.json and cover images.
+    Two equal snapshots taken a settle period apart mean the copy is done.
+    """
+    audio = []
+    metadata = []
+    for root, dirs, files in os.walk(album_dir):
+        dirs.sort()
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name.lower())
+            if ext in (".flac", ".cue"):
+                target = audio
+            elif name.lower() == "info.json" or (
+                stem in COVER_NAMES and ext in COVER_EXTENSIONS
+            ):
+                target = metadata
+            else:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            target.append(
+                (os.path.relpath(path, album_dir), st.st_size, st.st_mtime_ns)
+            )
+    return tuple(audio), tuple(metadata)
+
+
+class JobQueue:
+    """Thread-safe priority queue of (stage, album_dir) jobs, FIFO within a
+    priority. ``get`` returns None once the queue is closed."""
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, stage: str, album_dir: Path):
+        with self._cond:
+            entry = (STAGE_PRIORITY[stage], next(self._order), stage, album_dir)
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._heap and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            _, _, stage, album_dir = heapq.heappop(self._heap)
+            return stage, album_dir
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+
+class WatchDaemon:
+    """Watch drop folders and run extract → convert → retag per album.
+
+    Every direct sub-folder of a drop folder is one album. An album is only
+    queued once no events arrived for ``settle`` seconds and two snapshots of
+    its file sizes, taken ``settle`` seconds apart, are equal. Jobs run on
+    ``workers`` long-lived threads in this process, so the libraries stay
+    imported between albums; tracks within an album are encoded with
+    ``jobs`` parallel ffmpeg processes as in ``convert_flac_mp3.py``.
+    """
+
+    def __init__(self, drop_dirs, output_dir: Path, options: dict):
+        self.drop_dirs = [d.resolve() for d in drop_dirs]
+        self.output_dir = output_dir.resolve()
+        self.options = options
+        self.settle = options["settle"]
+        self.queue = JobQueue()
+        self._lock = threading.Lock()
+        # album_dir -> [last event time, last snapshot]
+        self._pending = {}
+        # albums with a queued or running job
+        self._busy = set()
+        # album_dir -> snapshot taken when its last job finished
+        self._processed = {}
+        self._workers = []
+        self._stopping = threading.Event()
+
+    def album_of(self, path: Path) -> Path | None:
+        for drop_dir in self.drop_dirs:
+            try:
+                relative = path.relative_to(drop_dir)
+            except ValueError:
+                continue
+            if relative.parts:
+                return drop_dir / relative.parts[0]
+        return None
+
+    def mark(self, album_dir: Path, reset: bool = True):
+        """Record a change in ``album_dir``; ``reset`` restarts its settle
+        timer if it is already pending."""
+        with self._lock:
+            if reset or album_dir not in self._pending:
+                self._pending[album_dir] = [time.monotonic(), None]
+
+    def rescan(self, reset: bool = True):
+        """Mark every album in the drop folders as changed."""
+        for drop_dir in self.drop_dirs:
+            with os.scandir(drop_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.mark(Path(entry.path), reset)
+
+    def check_settled(self):
+        now = time.monotonic()
+        settled = []
+        with self._lock:
+            for album_dir, state in list(self._pending.items()):
+                if now - state[0] < self.settle or album_dir in self._busy:
+                    continue
+                if not album_dir.is_dir():
+                    del self._pending[album_dir]
+                    continue
+                snapshot = album_snapshot(album_dir)
+                if snapshot != state[1]:
+                    # Still being copied (or first look): wait another period
+                    self._pending[album_dir] = [now, snapshot]
+                    continue
+                del self._pending[album_dir]
+                settled.append((album_dir, snapshot))
+
+        for album_dir, snapshot in settled:
+            self.schedule(album_dir, snapshot)
+
+    def schedule(self, album_dir: Path, snapshot):
+        audio, _ = snapshot
+        if not any(name.lower().endswith(".flac") for name, _, _ in audio):
+            return
+        with self._lock:
+            previous = self._processed.get(album_dir)
+            if previous == snapshot:
+                return
+            if previous and previous[0] == audio:
+                # Only info.json or the cover changed: the manifest turns the
+                # conversion into a re-tag
+                stage = "retag"
+            elif (album_dir / "info.json").exists():
+                stage = "convert"
+            else:
+                stage = "extract"
+            self._busy.add(album_dir)
+        print(f"📥 Queued {stage}: {album_dir.name} ({len(self.queue) + 1} waiting)")
+        self.queue.put(stage, album_dir)
+
+    def start_workers(self):
+        for n in range(max(1, self.options["workers"])):
+            worker = threading.Thread(
+                target=self._work, name=f"watch-worker-{n}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            stage, album_dir = job
+            started = time.perf_counter()
+            next_stage = None
+            try:
+                with instrumentation.stage(stage, album_dir):
+                    if stage == "extract":
+                        self.extract(album_dir)
+                        next_stage = "convert"
+                    else:
+                        self.convert(album_dir)
+                print(
+                    f"✅ {stage} finished: {album_dir.name} "
+                    f"({time.perf_counter() - started:.1f}s)"
+                )
+            except Exception as e:
+                print(f"❌ {stage} failed: {album_dir.name} ({e})")
+
+            if next_stage and not self._stopping.is_set():
+                self.queue.put(next_stage, album_dir)
+                continue
+            with self._lock:
+                # Failed albums are not retried until their files change
+                self._processed[album_dir] = album_snapshot(album_dir)
+                self._busy.discard(album_dir)
+
+    def extract(self, album_dir: Path):
+        albums = collect_albums([album_dir])
+        if not albums:
+            return
+        # Multi-disc albums (CD1/, CD2/) share one info.json at the top
+        flac_files = albums.get(album_dir) or next(iter(albums.values()))
+        extract_album(flac_files, album_dir)
+
+    def convert(self, album_dir: Path):
+        info_path = album_dir / "info.json"
+        if not info_path.exists():
+            raise FileNotFoundError(f"no info.json in {album_dir}")
+        with info_path.open("r", encoding="utf-8") as f:
+            info = json.load(f)
+
+        options = self.options
+        output_base = self.output_dir / album_dir.name
+        output_base.mkdir(parents=True, exist_ok=True)
+        cover_cache = CoverCache(options["cover_max_size"], options["cover_max_bytes"])
+        images = sorted(p for p in album_dir.iterdir() if p.suffix.lower() == ".flac")
+        if len(images) == 1 and info.get("tracks"):
+            failed = convert_cue_flac(
+                info_path,
+                images[0],
+                options["jobs"],
+                options["single_decode"],
+                False,
+                cover_cache,
+                options["gapless"],
+                options["profiles"],
+                output_base,
+            )
+        else:
+            failed = convert_flac_folder(
+                info_path,
+                album_dir,
+                options["jobs"],
+                False,
+                cover_cache,
+                options["profiles"],
+                output_base,
+            )
+        # Failed tracks are only counted by the converters; raising makes the
+        # album count as failed, so it is retried once its files change
+        if failed:
+            raise RuntimeError(f"{failed} tracks failed")
+
+    def run(self, watcher: Inotify | None):
+        """Main loop; returns on KeyboardInterrupt/SIGTERM."""
+        if watcher:
+            for drop_dir in self.drop_dirs:
+                watcher.add_tree(drop_dir)
+        # Albums that landed while the daemon was not running
+        self.rescan()
+        self.start_workers()
+        print(f"👀 Watching {', '.join(str(d) for d in self.drop_dirs)}")
+
+        try:
+            while True:
+                if watcher:
+                    for path, _ in watcher.read(timeout=1.0):
+                        if path is None:
+                            print("⚠️  Missed events (queue overflow), rescanning")
+                            self.rescan()
+                            continue
+                        album_dir = self.album_of(path)
+                        if album_dir:
+                            self.mark(album_dir)
+                else:
+                    # Without events the size snapshots alone tell when a
+                    # copy is done
+                    time.sleep(self.settle)
+                    self.rescan(reset=False)
+                self.check_settled()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping after the running jobs")
+        finally:
+            self._stopping.set()
+            self.queue.close()
+            for worker in self._workers:
+                worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch drop folders and convert new FLAC albums as they land."
+    )
+    parser.add_argument(
+        "drop_dirs",
+        type=Path,
+        nargs="+",
+        help="Folders to watch; every sub-folder is one album",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        required=True,
+        help="Library folder; each album goes to <output>/<album>/output_<format>/",
+    )
+    parser.add_argument(
+        "--formats",
+        default=DEFAULT_PROFILES,
+        help=f"Output formats as in convert_flac_mp3.py (default: {DEFAULT_PROFILES}; choose from {', '.join(PROFILES)})",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE,
+        help=f"Seconds without changes before an album counts as copied (default: {DEFAULT_SETTLE})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Albums processed at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Tracks encoded in parallel per album (default: {DEFAULT_JOBS})",
+    )
+    parser.add_argument("--single-decode", action="store_true")
+    parser.add_argument("--gapless", action="store_true")
+    parser.add_argument("--cover-max-size", type=int, default=0)
+    parser.add_argument("--cover-max-kb", type=int, default=0)
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Rescan every --settle seconds instead of using inotify",
+    )
+    parser.add_argument(
+        "--events",
+        type=Path,
+        help="Append a JSON line per timed step to this file",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print per-stage totals and the slowest steps on exit",
+    )
+    args = parser.parse_args()
+
+    try:
+        profiles = parse_profiles(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    missing = [d for d in args.drop_dirs if not d.is_dir()]
+    if missing:
+        for drop_dir in missing:
+            print(f"❌ Folder not found: {drop_dir}")
+        sys.exit(1)
+    output_dir = args.output.resolve()
+    if any(output_dir.is_relative_to(d.resolve()) for d in args.drop_dirs):
+        parser.error("--output must not be inside a drop folder")
+
+    instrumentation.configure(args.events, args.timings)
+    daemon = WatchDaemon(
+        args.drop_dirs,
+        output_dir,
+        {
+            "profiles": profiles,
+            "settle": args.settle,
+            "workers": args.workers,
+            "jobs": args.jobs,
+            "single_decode": args.single_decode,
+            "gapless": args.gapless,
+            "cover_max_size": args.cover_max_size,
+            "cover_max_bytes": args.cover_max_kb * 1024,
+        },
+    )
+
+    # systemd and friends stop services with SIGTERM
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    watcher = None
+    if not args.poll:
+        try:
+            watcher = Inotify()
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify unavailable ({e}), polling every {args.settle}s")
+    try:
+        daemon.run(watcher)
+    finally:
+        if watcher:
+            watcher.close()
+    instrumentation.summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import atexit
+import json
+import time
 import subprocess
 import re
 import sys
 import os
 import pty
 import select
+import sqlite3
+from itertools import groupby
+from collections import deque
 from datetime import datetime
 
 
@@ -53,17 +60,326 @@ def parse_throughput(line: str) -> tuple[float, str] | None:
     return throughput, direction
 
 
+def interval_samples(data: dict) -> list[dict]:
+    """Flatten one ``--json-stream`` interval into samples.
+
+    Returns one dict per stream plus one per direction total (``stream`` is
+    the socket number or ``"SUM"``), each with ``direction`` (TX/RX),
+    ``bps``, ``retransmits``, ``cwnd`` (bytes) and ``rtt`` (microseconds).
+    TCP details are only reported by the sending side, so they are None on
+    received streams.
+    """
+    samples = []
+    for stream in data.get("streams", []):
+        samples.append(
+            {
+                "stream": stream.get("socket"),
+                "direction": "TX" if stream.get("sender") else "RX",
+                "bps": stream.get("bits_per_second", 0.0),
+                "retransmits": stream.get("retransmits"),
+                "cwnd": stream.get("snd_cwnd"),
+                "rtt": stream.get("rtt"),
+            }
+        )
+    # "sum_bidir_reverse" holds the other direction in --bidir tests
+    for key in ("sum", "sum_bidir_reverse"):
+        total = data.get(key)
+        if total:
+            samples.append(
+                {
+                    "stream": "SUM",
+                    "direction": "TX" if total.get("sender") else "RX",
+                    "bps": total.get("bits_per_second", 0.0),
+                    "retransmits": total.get("retransmits"),
+                    "cwnd": None,
+                    "rtt": None,
+                }
+            )
+    return samples
+
+
+def format_sample(sample: dict) -> str:
+    text = f"[{sample['direction']}] {sample['bps']/1e6:.2f} Mbps"
+    if sample["retransmits"] is not None:
+        text += f", retr {sample['retransmits']}"
+    if sample["cwnd"] is not None:
+        text += f", cwnd {sample['cwnd']/1024:.0f} KB"
+    if sample["rtt"] is not None:
+        text += f", rtt {sample['rtt']/1000:.2f} ms"
+    return text
+
+
+class AlertLog:
+    """Append-only log file opened once per run instead of reopening it for
+    every line. Each line is flushed right away: alerts and summaries are
+    rare, and ``tail -f`` on the log must see them as they happen."""
+
+    def __init__(self, path: str = "iperf_alert.log"):
+        self.path = path
+        self._file = None
+
+    def write(self, msg: str):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            atexit.register(self.close)
+        self._file.write(f"[{timestamp}] {msg}\n")
+        self._file.flush()
+        print(f"[{timestamp}] {msg}")
+        sys.stdout.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+ALERT_LOG = AlertLog()
+
+
 def log_alert(msg: str):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("iperf_alert.log", "a") as f:
-        f.write(f"[{timestamp}] {msg}\n")
-    print(f"[{timestamp}] {msg}")
-    sys.stdout.flush()
+    ALERT_LOG.write(msg)
+
+
+class SampleStore:
+    """Every interval sample in a SQLite table, inserted in batches of
+    ``batch_size`` rows or every ``flush_interval`` seconds."""
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 10.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            "ts REAL NOT NULL, link TEXT NOT NULL, direction TEXT NOT NULL,"
+            " bps REAL NOT NULL, retransmits INTEGER)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS samples_link_ts ON samples (link, ts)"
+        )
+        self.conn.commit()
+        self._rows = []
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+
+    def add(self, link: str, direction: str, bps: float, retransmits=None):
+        self._rows.append((time.time(), link, direction, bps, retransmits))
+        if (
+            len(self._rows) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO samples VALUES (?, ?, ?, ?, ?)", self._rows
+                )
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+
+# Set from --store; LinkMonitor records every sample here when present
+SAMPLE_STORE = None
+
+
+def parse_windows(value: str) -> list[int]:
+    """argparse type for --windows: a non-empty list of positive ints."""
+    try:
+        windows = [int(w) for w in value.split(",") if w.strip()]
+    except ValueError:
+        windows = []
+    if not windows or min(windows) < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected comma-separated positive numbers, got '{value}'"
+        )
+    return windows
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    pos = (len(sorted_values) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+class RollingStats:
+    """Throughput samples over the last ``max(windows)`` intervals plus an
+    EWMA. Memory is bounded by the largest window, so soak tests can run
+    for days; percentiles are only computed when a summary is asked for."""
+
+    def __init__(self, windows=(10, 60, 300), alpha: float = 0.1):
+        self.windows = sorted(windows)
+        self.alpha = alpha
+        self.samples = deque(maxlen=self.windows[-1])
+        self.ewma = None
+        self.count = 0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            self.ewma += self.alpha * (value - self.ewma)
+
+    def window(self, size: int) -> dict | None:
+        values = sorted(list(self.samples)[-size:])
+        if not values:
+            return None
+        return {
+            "mean": sum(values) / len(values),
+            "p5": percentile(values, 5),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+        }
+
+
+class AlertState:
+    """Debounced low-throughput alert with hysteresis.
+
+    Raises after ``alert_after`` consecutive samples below ``threshold`` and
+    clears after ``clear_after`` consecutive samples at or above
+    ``threshold * (1 + hysteresis)``, so a flapping link alerts once.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        alert_after: int = 3,
+        clear_after: int = 3,
+        hysteresis: float = 0.05,
+    ):
+        self.threshold = threshold
+        self.alert_after = alert_after
+        self.clear_after = clear_after
+        self.recover_level = threshold * (1 + hysteresis)
+        self.active = False
+        self._streak = 0
+
+    def update(self, value: float) -> str | None:
+        """Returns "alert" or "recovered" on a state change, else None."""
+        if self.active:
+            self._streak = self._streak + 1 if value >= self.recover_level else 0
+            if self._streak >= self.clear_after:
+                self.active = False
+                self._streak = 0
+                return "recovered"
+        else:
+            self._streak = self._streak + 1 if value < self.threshold else 0
+            if self._streak >= self.alert_after:
+                self.active = True
+                self._streak = 0
+                return "alert"
+        return None
+
+
+class LinkMonitor:
+    """Per-direction rolling stats and debounced alerts for one link, with a
+    summary line logged every ``summary_interval`` seconds."""
+
+    def __init__(
+        self,
+        name: str,
+        target_bps: float,
+        threshold: float = 0.85,
+        windows=(10, 60, 300),
+        alpha: float = 0.1,
+        alert_after: int = 3,
+        clear_after: int = 3,
+        hysteresis: float = 0.05,
+        summary_interval: float = 60,
+        verbose: bool = True,
+        link: str | None = None,
+    ):
+        self.name = name
+        self.link = link or name
+        self.target_bps = target_bps
+        self.threshold = threshold
+        self.stats_args = (windows, alpha)
+        self.alert_args = (target_bps * threshold, alert_after, clear_after, hysteresis)
+        self.summary_interval = summary_interval
+        self.verbose = verbose
+        self.directions = {}
+        self._last_summary = time.monotonic()
+
+    def add(
+        self,
+        direction: str,
+        bps: float,
+        detail: str | None = None,
+        retransmits: int | None = None,
+    ):
+        if SAMPLE_STORE is not None:
+            SAMPLE_STORE.add(self.link, direction, bps, retransmits)
+        if direction not in self.directions:
+            self.directions[direction] = (
+                RollingStats(*self.stats_args),
+                AlertState(*self.alert_args),
+            )
+        stats, alert = self.directions[direction]
+        stats.add(bps)
+        detail = detail or f"[{direction}] {bps/1e6:.2f} Mbps"
+        prefix = f"[{self.name}] " if self.name else ""
+
+        change = alert.update(bps)
+        if change == "alert":
+            log_alert(
+                f"{prefix}Low throughput: {detail} (< {self.threshold:.0%} of target for {alert.alert_after} intervals) target was {self.target_bps/1e6:.2f} Mbps"
+            )
+        elif change == "recovered":
+            log_alert(f"{prefix}Recovered: {detail}")
+        elif self.verbose:
+            print(f"{'⚠ Low' if bps < alert.threshold else '✓ OK'}: {detail}")
+            sys.stdout.flush()
+
+        if (
+            self.summary_interval
+            and time.monotonic() - self._last_summary >= self.summary_interval
+        ):
+            self._last_summary = time.monotonic()
+            for line in self.summary_lines():
+                log_alert(line)
+
+    def summary_lines(self) -> list[str]:
+        prefix = f"[{self.name}] " if self.name else ""
+        lines = []
+        for direction, (stats, alert) in self.directions.items():
+            parts = []
+            for size in stats.windows:
+                w = stats.window(size)
+                parts.append(
+                    f"{size}s mean {w['mean']/1e6:.1f} p5 {w['p5']/1e6:.1f}"
+                    f" p50 {w['p50']/1e6:.1f} p95 {w['p95']/1e6:.1f}"
+                )
+            state = "ALERT" if alert.active else "ok"
+            lines.append(
+                f"{prefix}Summary [{direction}] {' | '.join(parts)} | ewma {stats.ewma/1e6:.1f} Mbps, {stats.count} samples, {state}"
+            )
+        return lines
 
 
-def run_iperf_pty(server: str, port: int, target_bps: float, duration: int, mode: str):
+def run_iperf_pty(
+    server: str,
+    port: int,
+    target_bps: float,
+    duration: int,
+    mode: str,
+    monitor_options: dict | None = None,
+):
     """Run iperf3 using PTY to get real-time output"""
-    threshold = target_bps * 0.85
+    monitor = LinkMonitor(
+        "", target_bps, link=f"{server}:{port}", **(monitor_options or {})
+    )
 
     while True:
         cmd = ["iperf3", "-c", server, "-p", str(port), "-i", "1"]
@@ -123,15 +439,7 @@ def run_iperf_pty(server: str, port: int, target_bps: float, duration: int, mode
                                             clean_line
                                         )
                                         if throughput is not None:
-                                            if throughput < threshold:
-                                                log_alert(
-                                                    f"Low throughput: [{direction}] {throughput/1e6:.2f} Mbps (< 85% of target) target was {target_bps/1e6:.2f} Mbps"
-                                                )
-                                            else:
-                                                print(
-                                                    f"✓ OK: {throughput/1e6:.2f} Mbps"
-                                                )
-                                                sys.stdout.flush()
+                                            monitor.add(direction, throughput)
 
                 except OSError:
                     break
@@ -160,12 +468,306 @@ def run_iperf_pty(server: str, port: int, target_bps: float, duration: int, mode
         if duration > 0:
             break
 
+    for line in monitor.summary_lines():
+        print(line)
+
+
+def json_stream_cmd(
+    server: str, port: int, duration: int, mode: str, parallel: int = 1
+) -> list[str]:
+    cmd = ["iperf3", "-c", server, "-p", str(port), "-i", "1", "--json-stream"]
+    cmd += ["-t", str(duration) if duration > 0 else "0"]
+    if parallel > 1:
+        cmd += ["-P", str(parallel)]
+
+    if mode == "bidir":
+        cmd += ["--bidir"]
+    elif mode == "reverse":
+        cmd += ["--reverse"]
+    return cmd
+
+
+def run_iperf_json(
+    server: str,
+    port: int,
+    target_bps: float,
+    duration: int,
+    mode: str,
+    parallel: int = 1,
+    monitor_options: dict | None = None,
+):
+    """Run iperf3 with --json-stream (iperf3 >= 3.17) and parse one JSON
+    event per line, so there is no PTY, ANSI stripping or regex scraping."""
+    monitor = LinkMonitor(
+        "", target_bps, link=f"{server}:{port}", **(monitor_options or {})
+    )
+
+    while True:
+        cmd = json_stream_cmd(server, port, duration, mode, parallel)
+        print(f"Running command: {' '.join(cmd)}")
+
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+
+            for line in process.stdout:  # type: ignore
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # iperf3 errors before the test starts are plain text
+                    if line.strip():
+                        print(line.strip())
+                    continue
+
+                kind = event.get("event")
+                data = event.get("data")
+                if kind == "interval":
+                    for sample in interval_samples(data):
+                        if sample["stream"] != "SUM":
+                            if parallel > 1:
+                                print(
+                                    f"  stream {sample['stream']} {format_sample(sample)}"
+                                )
+                        else:
+                            monitor.add(
+                                sample["direction"],
+                                sample["bps"],
+                                format_sample(sample),
+                                sample["retransmits"],
+                            )
+                    sys.stdout.flush()
+                elif kind == "error":
+                    print(f"Error: {data}")
+                elif kind == "end":
+                    for key in ("sum_sent", "sum_received"):
+                        total = data.get(key)
+                        if total:
+                            print(
+                                f"{key}: {total.get('bits_per_second', 0)/1e6:.2f} Mbps"
+                            )
+
+            process.wait()
+
+        except KeyboardInterrupt:
+            print("\nStopping test.")
+            process.terminate()  # pyright: ignore
+            break
+        except Exception as e:
+            print(f"Error: {e}")
+            break
+
+        if duration > 0:
+            break
+
+    for line in monitor.summary_lines():
+        print(line)
+
+
+def load_targets(path: str) -> list[dict]:
+    """Read a target list: one ``server port mode speed [threshold]`` per
+    line, ``#`` starts a comment. ``threshold`` is the alert fraction of
+    ``speed`` (default 0.85)."""
+    targets = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) < 4:
+                raise ValueError(f"{path}:{line_no}: expected server port mode speed")
+            server, port, mode, speed = fields[:4]
+            if mode not in ("client", "reverse", "bidir"):
+                raise ValueError(f"{path}:{line_no}: unknown mode {mode!r}")
+            targets.append(
+                {
+                    "name": f"{server}:{port}",
+                    "server": server,
+                    "port": int(port),
+                    "mode": mode,
+                    "target_bps": parse_speed(speed),
+                    "threshold": float(fields[4]) if len(fields) > 4 else 0.85,
+                }
+            )
+    return targets
+
+
+async def monitor_target(
+    target: dict,
+    duration: int,
+    start_delay: float,
+    limiter: asyncio.Semaphore,
+    stats: dict,
+    monitor_options: dict | None = None,
+):
+    """Run one target's iperf3 --json-stream client and feed its interval
+    totals into ``stats[target["name"]]``."""
+    name = target["name"]
+    options = dict(monitor_options or {}, threshold=target["threshold"])
+    monitor = LinkMonitor(name, target["target_bps"], verbose=False, **options)
+    result = stats.setdefault(
+        name, {"samples": 0, "low": 0, "total_bps": 0.0, "min_bps": None, "errors": 0}
+    )
+    await asyncio.sleep(start_delay)
+
+    while True:
+        cmd = json_stream_cmd(
+            target["server"], target["port"], duration, target["mode"]
+        )
+        async with limiter:
+            print(f"[{name}] Running command: {' '.join(cmd)}")
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                # Interval lines grow with the stream count
+                limit=1 << 20,
+            )
+            try:
+                async for raw in process.stdout:  # type: ignore
+                    try:
+                        event = json.loads(raw)
+                    except ValueError:
+                        if raw.strip():
+                            print(f"[{name}] {raw.decode(errors='ignore').strip()}")
+                        continue
+
+                    if event.get("event") == "error":
+                        result["errors"] += 1
+                        print(f"[{name}] Error: {event.get('data')}")
+                    elif event.get("event") == "interval":
+                        for sample in interval_samples(event["data"]):
+                            if sample["stream"] != "SUM":
+                                continue
+                            result["samples"] += 1
+                            result["total_bps"] += sample["bps"]
+                            if (
+                                result["min_bps"] is None
+                                or sample["bps"] < result["min_bps"]
+                            ):
+                                result["min_bps"] = sample["bps"]
+                            if sample["bps"] < monitor.alert_args[0]:
+                                result["low"] += 1
+                            monitor.add(
+                                sample["direction"],
+                                sample["bps"],
+                                format_sample(sample),
+                                sample["retransmits"],
+                            )
+                await process.wait()
+            except asyncio.CancelledError:
+                if process.returncode is None:
+                    process.terminate()
+                    await process.wait()
+                raise
+
+        if duration > 0:
+            break
+        # Continuous mode: reconnect, but do not spin on a refused connection
+        await asyncio.sleep(1)
+
+
+def query_store(path: str, link: str | None = None, days: int = 0):
+    """Print throughput percentiles per link, day and direction."""
+    if not os.path.exists(path):
+        print(f"Error: {path} does not exist")
+        return
+    conn = sqlite3.connect(path)
+    where = []
+    params = []
+    if link:
+        where.append("link = ?")
+        params.append(link)
+    if days:
+        where.append("ts >= ?")
+        params.append(time.time() - days * 86400)
+    try:
+        rows = conn.execute(
+            "SELECT link, date(ts, 'unixepoch', 'localtime') AS day, direction, bps"
+            " FROM samples"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY link, day, direction, bps",
+            params,
+        )
+    except sqlite3.DatabaseError as e:
+        # Not a database at all, or not one written by --store
+        print(f"Error: cannot read samples from {path} ({e})")
+        conn.close()
+        return
+
+    print(
+        f"{'link':<24} {'day':<10} {'dir':<6} {'samples':>8}"
+        f" {'p5':>9} {'p50':>9} {'p95':>9} {'mean':>9}  (Mbps)"
+    )
+    for (link_name, day, direction), group in groupby(rows, key=lambda r: r[:3]):
+        values = [r[3] for r in group]
+        print(
+            f"{link_name:<24} {day:<10} {direction:<6} {len(values):>8}"
+            f" {percentile(values, 5)/1e6:>9.1f} {percentile(values, 50)/1e6:>9.1f}"
+            f" {percentile(values, 95)/1e6:>9.1f} {sum(values)/len(values)/1e6:>9.1f}"
+        )
+    conn.close()
+
+
+def print_target_summary(targets: list[dict], stats: dict):
+    print("\nSummary:")
+    for target in targets:
+        result = stats.get(target["name"])
+        if not result or not result["samples"]:
+            print(f"  {target['name']:<24} no samples")
+            continue
+        print(
+            f"  {target['name']:<24} avg {result['total_bps'] / result['samples'] / 1e6:.2f} Mbps,"
+            f" min {result['min_bps'] / 1e6:.2f} Mbps,"
+            f" {result['low']}/{result['samples']} low, {result['errors']} errors"
+            f" (target {target['target_bps']/1e6:.2f} Mbps)"
+        )
+
+
+async def run_targets(
+    targets: list[dict],
+    duration: int,
+    stagger: float,
+    max_concurrent: int,
+    monitor_options: dict | None = None,
+):
+    """Monitor every target from one event loop. Starts are spread
+    ``stagger`` seconds apart and at most ``max_concurrent`` clients run at
+    once (0 = no limit), so tests do not all hit a shared uplink together."""
+    limiter = asyncio.Semaphore(max_concurrent or len(targets))
+    stats = {}
+    tasks = [
+        asyncio.create_task(
+            monitor_target(t, duration, i * stagger, limiter, stats, monitor_options)
+        )
+        for i, t in enumerate(targets)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        print_target_summary(targets, stats)
+
 
 def run_iperf_simple(
-    server: str, port: int, target_bps: float, duration: int, mode: str
+    server: str,
+    port: int,
+    target_bps: float,
+    duration: int,
+    mode: str,
+    monitor_options: dict | None = None,
 ):
     """Alternative: Run iperf3 with expect-like approach"""
-    threshold = target_bps * 0.85
+    monitor = LinkMonitor(
+        "", target_bps, link=f"{server}:{port}", **(monitor_options or {})
+    )
 
     while True:
         cmd = f"unbuffer iperf3 -c {server} -p {port} -i 1"
@@ -200,13 +802,7 @@ def run_iperf_simple(
                     if "bits/sec" in line:
                         throughput, direction = parse_throughput(line)
                         if throughput is not None:
-                            if throughput < threshold:
-                                log_alert(
-                                    f"Low throughput: [{direction}] {throughput/1e6:.2f} Mbps (< 85% of target)"
-                                )
-                            else:
-                                print(f"✓ OK: {throughput/1e6:.2f} Mbps")
-                                sys.stdout.flush()
+                            monitor.add(direction, throughput)
 
         except KeyboardInterrupt:
             print("\nStopping test.")
@@ -219,13 +815,30 @@ def run_iperf_simple(
         if duration > 0:
             break
 
+    for line in monitor.summary_lines():
+        print(line)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="iperf3 throughput monitor")
+    parser.add_argument("--target", help="Target speed (e.g. 10G, 1G, 500M)")
+    parser.add_argument("--server", help="iperf3 server address")
+    parser.add_argument(
+        "--targets",
+        help="File with one 'server port mode speed [threshold]' per line; monitors all of them concurrently (json method)",
+    )
+    parser.add_argument(
+        "--stagger",
+        type=float,
+        default=2.0,
+        help="Seconds between target starts with --targets (default: 2)",
+    )
     parser.add_argument(
-        "--target", required=True, help="Target speed (e.g. 10G, 1G, 500M)"
+        "--max-concurrent",
+        type=int,
+        default=0,
+        help="Maximum iperf3 clients running at once with --targets (default: all)",
     )
-    parser.add_argument("--server", required=True, help="iperf3 server address")
     parser.add_argument(
         "--port", type=int, default=5201, help="iperf3 server port (default: 5201)"
     )
@@ -240,19 +853,140 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--method",
-        choices=["pty", "unbuffer"],
+        choices=["pty", "unbuffer", "json"],
         default="pty",
-        help="Method: pty (pseudo terminal) or unbuffer (requires expect package)",
+        help="Method: pty (pseudo terminal), unbuffer (requires expect package) or json (iperf3 >= 3.17 --json-stream)",
+    )
+    parser.add_argument(
+        "--store",
+        help="Append every interval sample to this SQLite file",
+    )
+    parser.add_argument(
+        "--query",
+        metavar="DB",
+        help="Print p5/p50/p95 per link and day from a --store file and exit",
+    )
+    parser.add_argument("--link", help="With --query: only this link (server:port)")
+    parser.add_argument(
+        "--days", type=int, default=0, help="With --query: only the last N days"
+    )
+    parser.add_argument(
+        "--windows",
+        type=parse_windows,
+        default="10,60,300",
+        help="Rolling statistics windows in samples/seconds (default: 10,60,300)",
+    )
+    parser.add_argument(
+        "--ewma-alpha",
+        type=float,
+        default=0.1,
+        help="Smoothing factor of the throughput EWMA (default: 0.1)",
+    )
+    parser.add_argument(
+        "--alert-after",
+        type=int,
+        default=3,
+        help="Consecutive low intervals before alerting (default: 3)",
+    )
+    parser.add_argument(
+        "--clear-after",
+        type=int,
+        default=3,
+        help="Consecutive good intervals before an alert clears (default: 3)",
+    )
+    parser.add_argument(
+        "--hysteresis",
+        type=float,
+        default=0.05,
+        help="An alert clears only above threshold * (1 + hysteresis) (default: 0.05)",
+    )
+    parser.add_argument(
+        "--summary-interval",
+        type=float,
+        default=60,
+        help="Seconds between summary lines in the log, 0 = off (default: 60)",
+    )
+    parser.add_argument(
+        "-P",
+        "--parallel",
+        type=int,
+        default=1,
+        help="Parallel streams (json method; per-stream stats are printed when > 1)",
     )
 
     args = parser.parse_args()
+    if args.query:
+        query_store(args.query, args.link, args.days)
+        sys.exit(0)
+    if args.store:
+        SAMPLE_STORE = SampleStore(args.store)
+    monitor_options = {
+        "windows": args.windows,
+        "alpha": args.ewma_alpha,
+        "alert_after": args.alert_after,
+        "clear_after": args.clear_after,
+        "hysteresis": args.hysteresis,
+        "summary_interval": args.summary_interval,
+    }
+    if args.targets:
+        try:
+            targets = load_targets(args.targets)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if args.duration == 0 and 0 < args.max_concurrent < len(targets):
+            # Continuous clients never release their slot, so the other
+            # targets would wait forever
+            parser.error(
+                f"--duration 0 needs --max-concurrent 0 or at least {len(targets)}"
+                " (one per target)"
+            )
+        print(f"Monitoring {len(targets)} targets from {args.targets}")
+        try:
+            asyncio.run(
+                run_targets(
+                    targets,
+                    args.duration,
+                    args.stagger,
+                    args.max_concurrent,
+                    monitor_options,
+                )
+            )
+        except KeyboardInterrupt:
+            print("\nStopping tests.")
+        sys.exit(0)
+    if not args.target or not args.server:
+        parser.error("--target and --server are required unless --targets is given")
     target_bps = parse_speed(args.target)
 
     print(f"Target speed: {args.target} ({target_bps/1e6:.2f} Mbps)")
     print(f"Method: {args.method}")
 
     if args.method == "pty":
-        run_iperf_pty(args.server, args.port, target_bps, args.duration, args.mode)
+        run_iperf_pty(
+            args.server,
+            args.port,
+            target_bps,
+            args.duration,
+            args.mode,
+            monitor_options,
+        )
+    elif args.method == "json":
+        run_iperf_json(
+            args.server,
+            args.port,
+            target_bps,
+            args.duration,
+            args.mode,
+            args.parallel,
+            monitor_options,
+        )
     else:
         # Requires: sudo apt-get install expect
-        run_iperf_simple(args.server, args.port, target_bps, args.duration, args.mode)
+        run_iperf_simple(
+            args.server,
+            args.port,
+            target_bps,
+            args.duration,
+            args.mode,
+            monitor_options,
+        )
@@ -0,0 +1,80 @@
+import argparse
+
+import pytest
+
+from test_iperf import AlertState, RollingStats, parse_windows, percentile
+
+
+def test_percentile_single_value():
+    assert percentile([7.0], 0) == 7.0
+    assert percentile([7.0], 50) == 7.0
+    assert percentile([7.0], 100) == 7.0
+
+
+def test_percentile_ends_and_interpolation():
+    values = [10.0, 20.0, 30.0, 40.0, 50.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 100) == 50.0
+    assert percentile(values, 50) == 30.0
+    assert percentile(values, 5) == pytest.approx(12.0)
+    assert percentile([1.0, 2.0], 50) == pytest.approx(1.5)
+
+
+def test_ewma_starts_at_first_sample_and_moves_by_alpha():
+    stats = RollingStats(windows=[4], alpha=0.5)
+    assert stats.ewma is None
+    stats.add(100.0)
+    assert stats.ewma == 100.0
+    stats.add(200.0)
+    assert stats.ewma == pytest.approx(150.0)
+    stats.add(50.0)
+    assert stats.ewma == pytest.approx(100.0)
+
+
+def test_windows_keep_only_the_latest_samples():
+    stats = RollingStats(windows=[3, 2])
+    assert stats.window(2) is None
+    for value in [1.0, 2.0, 3.0, 4.0, 5.0]:
+        stats.add(value)
+    assert stats.count == 5
+    assert list(stats.samples) == [3.0, 4.0, 5.0]
+    assert stats.window(2)["mean"] == pytest.approx(4.5)
+    summary = stats.window(3)
+    assert summary["mean"] == pytest.approx(4.0)
+    assert summary["p50"] == 4.0
+    assert summary["p5"] == pytest.approx(3.1)
+    assert summary["p95"] == pytest.approx(4.9)
+
+
+def test_alert_raises_only_after_n_low_intervals():
+    alert = AlertState(threshold=100, alert_after=3, clear_after=2)
+    assert alert.update(50) is None
+    assert alert.update(50) is None
+    # A good interval resets the streak
+    assert alert.update(150) is None
+    assert alert.update(50) is None
+    assert alert.update(50) is None
+    assert alert.update(50) == "alert"
+    assert alert.active
+    # Still low: no repeated alert
+    assert alert.update(50) is None
+
+
+def test_alert_clears_only_above_hysteresis_level():
+    alert = AlertState(threshold=100, alert_after=1, clear_after=2, hysteresis=0.1)
+    assert alert.update(50) == "alert"
+    # At the threshold but below threshold * 1.1 does not count as recovered
+    assert alert.update(105) is None
+    assert alert.update(105) is None
+    assert alert.update(110) is None
+    assert alert.update(50) is None
+    assert alert.update(120) is None
+    assert alert.update(120) == "recovered"
+    assert not alert.active
+
+
+def test_parse_windows():
+    assert parse_windows("10, 60,300") == [10, 60, 300]
+    for value in ["", ",", "0,10", "-5", "ten"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_windows(value)
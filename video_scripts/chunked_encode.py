@@ -0,0 +1,178 @@
+"""Encode one long video as keyframe-aligned chunks in parallel.
+
+The source is cut only at its own keyframes. Each chunk is encoded by its
+own HandBrake process with the same preset (and one crop for all chunks,
+taken from a scan of the whole file), then the chunks are joined with
+ffmpeg's concat demuxer without re-encoding, and the audio, subtitles and
+chapters are muxed back in from the source. Every chunk is checked against
+the source duration it covers. If any chunk is off, the file is encoded
+the normal way instead, so the result never has missing or repeated
+frames at a seam.
+"""
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+import instrumentation
+from media_probe import stereo_audio_args
+
+CHUNK_SECONDS = 120
+CHUNK_JOBS = 4
+HANDBRAKE_CLOCK = 90000
+# Work folders in the output folder, one per file being encoded
+CHUNK_DIR_PREFIX = ".chunks_"
+AUTOCROP_RE = re.compile(r"autocrop[^\d]*(\d+)/(\d+)/(\d+)/(\d+)")
+# Allowed difference between a chunk and the source span it covers, in
+# output frames
+FRAME_TOLERANCE = 1.5
+# The H.265 MKV 720p30 preset caps the frame rate, so a 50/60 fps source
+# comes out with 33 ms frames
+OUTPUT_MAX_FPS = 30
+
+
+class ChunkMismatch(Exception):
+    pass
+
+
+def probe_keyframes(input_path):
+    """Return (keyframe times, frame duration) for the first video stream,
+    relative to its first packet. Reads packets only, nothing is decoded."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(input_path)]
+    result = instrumentation.run("ffprobe", cmd, input_path, stdout=subprocess.PIPE, check=True, text=True)
+    times = []
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if not pts or pts == "N/A":
+            continue
+        times.append(float(pts))
+        if "K" in flags:
+            keyframes.append(float(pts))
+    if not keyframes:
+        return [], 0.0
+    start = min(times)
+    times.sort()
+    steps = sorted(b - a for a, b in zip(times, times[1:]) if b > a)
+    frame_duration = steps[len(steps) // 2] if steps else 0.0
+    return [t - start for t in keyframes], frame_duration
+
+
+def plan_chunks(keyframes, duration, chunk_seconds):
+    """Pick keyframes about `chunk_seconds` apart; returns [(start, end)].
+    A short tail is merged into the previous chunk."""
+    bounds = [0.0]
+    for keyframe in keyframes:
+        if keyframe >= bounds[-1] + chunk_seconds:
+            bounds.append(keyframe)
+    if len(bounds) > 1 and duration - bounds[-1] < chunk_seconds / 4:
+        bounds.pop()
+    return list(zip(bounds, bounds[1:] + [duration]))
+
+
+def scan_crop(input_path):
+    """Crop HandBrake would pick for the whole file, so every chunk gets the
+    same picture size. Falls back to no crop if the scan shows none."""
+    cmd = ["HandBrakeCLI", "-i", str(input_path), "--scan"]
+    result = instrumentation.run("handbrake", cmd, input_path, stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    match = AUTOCROP_RE.search(result.stderr or "")
+    return ":".join(match.groups()) if match else "0:0:0:0"
+
+
+def probe_duration(path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)]
+    result = instrumentation.run("ffprobe", cmd, path, stdout=subprocess.PIPE, check=True, text=True)
+    return float(result.stdout.strip() or 0)
+
+
+def encode_chunks(input_path, chunk_dir, chunks, crop, encode, threads, chunk_jobs, on_progress=None):
+    """Encode every chunk (video only) with `encode` (convert_video). Chunks
+    finished by an earlier, interrupted run are kept."""
+    total = sum(end - start for start, end in chunks)
+    progress = [0.0] * len(chunks)
+    lock = threading.Lock()
+
+    def report(i, percent):
+        if not on_progress:
+            return
+        with lock:
+            progress[i] = percent * (chunks[i][1] - chunks[i][0]) / total
+            on_progress(sum(progress))
+
+    def encode_chunk(i):
+        start, end = chunks[i]
+        # Named by the span, so chunks planned with another --chunk-seconds are not reused
+        path = chunk_dir / f"chunk_{start:010.3f}-{end:010.3f}.mkv"
+        if path.exists():
+            report(i, 100.0)
+            return path
+        args = ["--start-at", f"pts:{round(start * HANDBRAKE_CLOCK)}",
+                "--crop", crop, "--audio", "none", "--subtitle", "none"]
+        if i + 1 < len(chunks):
+            # The last chunk runs to the end of the source
+            args += ["--stop-at", f"pts:{round((end - start) * HANDBRAKE_CLOCK)}"]
+        partial = path.with_name(path.stem + ".partial.mkv")
+        # In-band parameter sets on every keyframe keep the joined stream
+        # decodable even if two chunks ended up with different headers
+        encode(input_path, partial, threads, lambda percent: report(i, percent), args, ["repeat-headers=1"])
+        os.replace(partial, path)
+        return path
+
+    with ThreadPoolExecutor(max_workers=max(1, chunk_jobs)) as pool:
+        return list(pool.map(encode_chunk, range(len(chunks))))
+
+
+def check_chunks(paths, chunks, frame_duration):
+    tolerance = FRAME_TOLERANCE * max(frame_duration, 1 / OUTPUT_MAX_FPS)
+    for path, (start, end) in zip(paths, chunks):
+        actual = probe_duration(path)
+        if abs(actual - (end - start)) > tolerance:
+            raise ChunkMismatch(f"{path.name} is {actual:.3f}s, expected {end - start:.3f}s")
+
+
+def join_chunks(input_path, output_path, paths, chunks, info):
+    """Concatenate the encoded chunks without re-encoding and mux in the
+    audio, subtitles and chapters of the source. Each chunk is placed at its
+    source offset, so audio stays in sync across seams."""
+    list_path = paths[0].parent / "chunks.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path, (start, end) in zip(paths, chunks):
+            f.write(f"file '{path.name}'\n")
+            f.write(f"duration {end - start:.6f}\n")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", str(list_path),
+           "-i", str(input_path), "-map", "0:v:0", "-c:v", "copy", *stereo_audio_args(info, 1),
+           "-map", "1:s?", "-c:s", "copy", "-map_chapters", "1", str(output_path)]
+    instrumentation.run("ffmpeg", cmd, input_path, output_path, check=True, stdin=subprocess.DEVNULL)
+
+
+def convert_video_chunked(input_path, output_path, info, encode, threads=None, on_progress=None,
+                          chunk_seconds=CHUNK_SECONDS, chunk_jobs=CHUNK_JOBS):
+    """Encode `input_path` in keyframe-aligned chunks on `chunk_jobs`
+    HandBrake processes (each with `threads` x265 threads) and join them into
+    `output_path`. Falls back to a single `encode` run for short files,
+    sources without usable keyframes, or chunks that do not line up."""
+    keyframes, frame_duration = probe_keyframes(input_path)
+    duration = info["duration"]
+    chunks = plan_chunks(keyframes, duration, chunk_seconds)
+    if len(chunks) < 2 or not frame_duration:
+        return encode(input_path, output_path, threads, on_progress)
+
+    chunk_dir = output_path.parent / f"{CHUNK_DIR_PREFIX}{input_path.stem}"
+    chunk_dir.mkdir(exist_ok=True)
+    tqdm.write(f"Chunked encode: {input_path.name} in {len(chunks)} chunks, {chunk_jobs} at a time")
+    crop = scan_crop(input_path)
+    paths = encode_chunks(input_path, chunk_dir, chunks, crop, encode, threads, chunk_jobs, on_progress)
+    try:
+        check_chunks(paths, chunks, frame_duration)
+    except ChunkMismatch as e:
+        tqdm.write(f"  Chunks do not line up ({e}), encoding {input_path.name} in one piece")
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        return encode(input_path, output_path, threads, on_progress)
+    join_chunks(input_path, output_path, paths, chunks, info)
+    shutil.rmtree(chunk_dir, ignore_errors=True)
@@ -1,29 +1,32 @@
 #!/bin/bash
 
-# Usage: ./convert_and_extract.sh <input_file> <base_name>
+# Usage: ./convert_and_extract.sh <input_file> <base_name> [languages]
 # Example:
 # ./convert_and_extract.sh Valentines.Day.2010.720p.BluRay.DTS.x264-HiDt.mkv Valentines.Day.2010
+# ./convert_and_extract.sh Valentines.Day.2010.720p.BluRay.DTS.x264-HiDt.mkv Valentines.Day.2010 eng,vie,fre
 
-if [ "$#" -ne 2 ]; then
-  echo "Usage: $0 <input_file> <base_name>"
+if [ "$#" -lt 2 ] || [ "$#" -gt 3 ]; then
+  echo "Usage: $0 <input_file> <base_name> [languages (default: eng,vie)]"
   exit 1
 fi
 
 INPUT="$1"
 BASENAME="$2"
+LANGS=",${3:-eng,vie},"
 
 # Step 1: Convert video
 OUTPUT="${BASENAME}.720p.BluRay.AAC2.0.x265-NR.mkv"
 echo "Converting to $OUTPUT ..."
 HandBrakeCLI --preset="H.265 MKV 720p30" -i "$INPUT" -o "$OUTPUT"
 
-# Step 2: Extract subtitles (only eng and vie)
+# Step 2: Extract subtitles (only wanted languages) in a single ffmpeg pass
 echo "Extracting subtitles from $INPUT ..."
-ffprobe -v error -select_streams s \
-  -show_entries stream=index,codec_name:stream_tags=language \
-  -of csv=p=0 "$INPUT" | while IFS=',' read -r IDX CODEC LANG; do
-
-  if [[ "$LANG" == "eng" || "$LANG" == "vie" ]]; then
+MAP_ARGS=()
+STREAMS=()
+TMP_FILES=()
+FINAL_FILES=()
+while IFS=',' read -r IDX CODEC LANG; do
+  if [[ "$LANGS" == *",$LANG,"* ]]; then
     # Determine extension
     case "$CODEC" in
       subrip) EXT="srt" ;;
@@ -38,18 +41,45 @@ ffprobe -v error -select_streams s \
     # tmp output name
     TMP_OUT="subtitle_${IDX}_${LANG}.${EXT}"
     echo "Extracting stream 0:$IDX ($LANG, $CODEC) -> $TMP_OUT"
-    ffmpeg -i "$INPUT" -map "0:$IDX" -c copy "$TMP_OUT"
+    MAP_ARGS+=(-map "0:$IDX" -c copy "$TMP_OUT")
+    STREAMS+=("$IDX")
+    TMP_FILES+=("$TMP_OUT")
+
+    case "$LANG" in
+      eng) SUFFIX="en" ;;
+      vie) SUFFIX="vi" ;;
+      *) SUFFIX="$LANG" ;;
+    esac
+    FINAL_FILES+=("${BASENAME}.720p.BluRay.AAC2.0.x265-NR.${SUFFIX}.${EXT}")
+  fi
+done < <(ffprobe -v error -select_streams s \
+  -show_entries stream=index,codec_name:stream_tags=language \
+  -of csv=p=0 "$INPUT")
 
-    # Step 3: Rename to proper name
-    if [ "$LANG" == "eng" ]; then
-      FINAL_OUT="${BASENAME}.720p.BluRay.AAC2.0.x265-NR.en.${EXT}"
+if [ "${#MAP_ARGS[@]}" -gt 0 ]; then
+  if ! ffmpeg -y -v error -i "$INPUT" "${MAP_ARGS[@]}" </dev/null; then
+    # One bad stream fails the whole pass and leaves the others incomplete,
+    # so start over with one pass per stream
+    echo "Single-pass extraction failed, extracting streams one by one"
+    rm -f "${TMP_FILES[@]}"
+    for i in "${!TMP_FILES[@]}"; do
+      ffmpeg -y -v error -i "$INPUT" -map "0:${STREAMS[$i]}" -c copy "${TMP_FILES[$i]}" </dev/null \
+        || rm -f "${TMP_FILES[$i]}"
+    done
+  fi
+
+  # Step 3: Rename to proper name, reporting each stream
+  for i in "${!TMP_FILES[@]}"; do
+    if [ -s "${TMP_FILES[$i]}" ]; then
+      echo "Renaming ${TMP_FILES[$i]} -> ${FINAL_FILES[$i]}"
+      mv "${TMP_FILES[$i]}" "${FINAL_FILES[$i]}"
     else
-      FINAL_OUT="${BASENAME}.720p.BluRay.AAC2.0.x265-NR.vi.${EXT}"
+      echo "FAILED: ${TMP_FILES[$i]}"
+      rm -f "${TMP_FILES[$i]}"
     fi
-    echo "Renaming $TMP_OUT -> $FINAL_OUT"
-    mv "$TMP_OUT" "$FINAL_OUT"
-  fi
-done
+  done
+else
+  echo "No subtitles in ${LANGS//,/ } found"
+fi
 
 echo "Done!"
-
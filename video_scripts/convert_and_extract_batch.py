@@ -2,106 +2,441 @@
 import os
 import re
 import subprocess
+import sys
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 
+import instrumentation
+import job_queue
+from chunked_encode import CHUNK_DIR_PREFIX, CHUNK_JOBS, CHUNK_SECONDS, convert_video_chunked
+from job_journal import JOURNAL_NAME, JobJournal
+from media_probe import PROBE_INDEX_NAME, ProbeIndex, estimate_seconds, plan_action, stereo_audio_args
+
+CPU_COUNT = os.cpu_count() or 1
+DEFAULT_SUB_LANGS = ("eng", "vie")
+LANG_SUFFIXES = {"eng": "en", "vie": "vi"}
+SUB_EXT_MAP = {
+    "subrip": "srt",
+    "ass": "ass",
+    "mov_text": "txt",
+    "webvtt": "vtt",
+    "dvb_subtitle": "sub",
+    "hdmv_pgs_subtitle": "sup"
+}
+HANDBRAKE_PRESET = "H.265 MKV 720p30"
+HANDBRAKE_PROGRESS_RE = re.compile(r"Encoding: task \d+ of \d+, ([\d.]+) %")
+# Unfinished outputs: *.partial-<pid>-<thread>.mkv (see write_atomically)
+PARTIAL_RE = re.compile(r"\.partial(-\d+-\d+)?$")
+
 def find_year(filename):
     """Tìm năm đầu tiên (19xx hoặc 20xx)"""
     match = re.search(r'(19\d{2}|20\d{2})', filename)
     return match.group(1) if match else None
 
-def convert_video(input_path, output_path):
-    print(f"Converting: {input_path} -> {output_path.name}")
+class ProgressBoard:
+    """Aggregate progress bar for all running transcodes (0-100 per file).
+    Files are shown by their path below `root`, so equal names in different
+    subfolders (--recursive) are kept apart."""
+
+    def __init__(self, total_files, root=None):
+        self.bar = tqdm(total=total_files * 100, desc="Transcoding", unit="%",
+                        bar_format="{l_bar}{bar}| {n:.0f}/{total_fmt} [{elapsed}<{remaining}]{postfix}")
+        self.lock = threading.Lock()
+        self.root = root
+        self.percent = {}
+        self.failed = set()
+
+    def label(self, file):
+        return file.relative_to(self.root).as_posix() if self.root else file.name
+
+    def update(self, file, percent):
+        name = self.label(file)
+        with self.lock:
+            delta = percent - self.percent.get(name, 0.0)
+            if delta <= 0:
+                return
+            self.percent[name] = percent
+            self.bar.update(delta)
+            self._show()
+
+    def _show(self):
+        active = [f"{n[:20]} {p:.0f}%" for n, p in self.percent.items() if p < 100]
+        if self.failed:
+            active.append(f"{len(self.failed)} failed")
+        self.bar.set_postfix_str(" | ".join(active))
+
+    def finish(self, file):
+        self.update(file, 100.0)
+
+    def fail(self, file):
+        """Count a failed file as finished so the bar still reaches the end."""
+        with self.lock:
+            self.failed.add(self.label(file))
+            self._show()
+        self.finish(file)
+
+    def close(self):
+        self.bar.close()
+
+def convert_video(input_path, output_path, threads=None, on_progress=None, extra_args=(), encopts=()):
+    """Encode with the H.265 720p preset. `extra_args` are added to the
+    HandBrake command and `encopts` to its x265 options."""
+    tqdm.write(f"Converting: {input_path} -> {output_path.name}")
     cmd = [
         "HandBrakeCLI",
-        "--preset=H.265 MKV 720p30",
+        f"--preset={HANDBRAKE_PRESET}",
         "-i", str(input_path),
-        "-o", str(output_path)
+        "-o", str(output_path),
+        *extra_args
     ]
-    subprocess.run(cmd, check=True)
+    encopts = list(encopts)
+    if threads:
+        # Cap x265's thread pool so several encodes can share the machine
+        encopts.insert(0, f"pools={threads}")
+    if encopts:
+        cmd += ["--encopts", ":".join(encopts)]
 
-def extract_and_rename_subtitles(input_path, output_basename, output_dir):
-    print(f"Extracting subtitles from: {input_path.name}")
-    cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "s",
-        "-show_entries", "stream=index,codec_name:stream_tags=language",
-        "-of", "csv=p=0", str(input_path)
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True)
-    lines = result.stdout.strip().splitlines()
+    with instrumentation.stage("handbrake", input_path, output_path) as event:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        # HandBrake redraws its progress line with \r, so split on both
+        buffer = ""
+        while True:
+            chunk = process.stdout.read(256)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(r"[\r\n]", buffer)
+            for line in lines:
+                match = HANDBRAKE_PROGRESS_RE.search(line)
+                if match and on_progress:
+                    on_progress(float(match.group(1)))
+        process.stdout.close()
+        event["exit_code"] = process.wait()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
 
+def extract_and_rename_subtitles(input_path, output_basename, output_dir, languages=DEFAULT_SUB_LANGS,
+                                 probe_streams=None):
+    """Extract every subtitle stream whose language is in `languages` with a
+    single ffmpeg demux pass. Returns {stream index: final path or None}.
+
+    `probe_streams` (from media_probe) avoids running ffprobe again."""
+    tqdm.write(f"Extracting subtitles from: {input_path.name}")
+    if probe_streams is not None:
+        lines = [f"{s['index']},{s['codec']},{s['language']}"
+                 for s in probe_streams if s["type"] == "subtitle"]
+    else:
+        cmd = [
+            "ffprobe", "-v", "error", "-select_streams", "s",
+            "-show_entries", "stream=index,codec_name:stream_tags=language",
+            "-of", "csv=p=0", str(input_path)
+        ]
+        result = instrumentation.run("ffprobe", cmd, input_path, stdout=subprocess.PIPE, check=True, text=True)
+        lines = result.stdout.strip().splitlines()
+
+    streams = []
+    used_names = set()
     for line in lines:
-        idx, codec, lang = line.split(',')
-        if lang not in ("eng", "vie"):
+        idx, codec, lang = (line.split(',') + ["", ""])[:3]
+        lang = lang or "und"
+        if lang not in languages:
             continue
 
-        ext_map = {
-            "subrip": "srt",
-            "ass": "ass",
-            "mov_text": "txt",
-            "webvtt": "vtt",
-            "dvb_subtitle": "sub",
-            "hdmv_pgs_subtitle": "sup"
-        }
-        ext = ext_map.get(codec, codec)
-        tmp_name = f"subtitle_{idx}_{lang}.{ext}"
-
-        print(f"  Extracting stream 0:{idx} ({lang}, {codec}) -> {tmp_name}")
-        extract_cmd = [
-            "ffmpeg", "-i", str(input_path),
-            "-map", f"0:{idx}",
-            "-c", "copy", tmp_name
-        ]
-        subprocess.run(extract_cmd, check=True)
+        ext = SUB_EXT_MAP.get(codec, codec)
+        # Unique per input so concurrent jobs never share a temp file
+        tmp_path = output_dir / f"{output_basename}.subtitle_{idx}_{lang}.{ext}"
+        lang_suffix = LANG_SUFFIXES.get(lang, lang)
+        final_name = f"{output_basename}.{lang_suffix}.{ext}"
+        if final_name in used_names:
+            final_name = f"{output_basename}.{lang_suffix}.{idx}.{ext}"
+        used_names.add(final_name)
+        streams.append((idx, lang, codec, tmp_path, output_dir / final_name))
+
+    if not streams:
+        tqdm.write(f"  No subtitles in {', '.join(languages)} found")
+        return {}
+
+    extract_cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(input_path)]
+    for idx, lang, codec, tmp_path, _ in streams:
+        tqdm.write(f"  Extracting stream 0:{idx} ({lang}, {codec}) -> {tmp_path.name}")
+        extract_cmd += ["-map", f"0:{idx}", "-c", "copy", str(tmp_path)]
+    combined = instrumentation.run("ffmpeg", extract_cmd, input_path, stdin=subprocess.DEVNULL)
+
+    results = {}
+    for idx, lang, codec, tmp_path, final_path in streams:
+        if combined.returncode != 0:
+            # One bad output aborts the whole pass; redo streams one by one
+            # so the good ones still get extracted.
+            single_cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(input_path),
+                          "-map", f"0:{idx}", "-c", "copy", str(tmp_path)]
+            instrumentation.run("ffmpeg", single_cmd, input_path, tmp_path, stdin=subprocess.DEVNULL)
+
+        if tmp_path.exists() and tmp_path.stat().st_size > 0:
+            os.replace(tmp_path, final_path)
+            tqdm.write(f"  ✅ stream 0:{idx} ({lang}) -> {final_path.name}")
+            results[idx] = final_path
+        else:
+            tmp_path.unlink(missing_ok=True)
+            tqdm.write(f"  ❌ stream 0:{idx} ({lang}, {codec}) failed")
+            results[idx] = None
+    return results
+
+def output_basename(file):
+    year = find_year(file.stem)
+    if year:
+        basename = file.stem.split(year, 1)[0] + year
+    else:
+        basename = file.stem
+    return f"{basename}.720p.BluRay.AAC2.0.x265-NR"
 
-        lang_suffix = ".en" if lang == "eng" else ".vi"
-        final_name = f"{output_basename}{lang_suffix}.{ext}"
-        final_path = output_dir / final_name
-        print(f"  Renaming {tmp_name} -> {final_path.name}")
-        os.rename(tmp_name, final_path)
+def remux_video(input_path, output_path, info):
+    """Copy an already-HEVC 720p video stream into the output name, bringing
+    the first audio track to stereo AAC like the HandBrake preset does."""
+    tqdm.write(f"Remuxing: {input_path} -> {output_path.name}")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(input_path), "-map", "0:v:0", "-c:v", "copy",
+           *stereo_audio_args(info), str(output_path)]
+    instrumentation.run("ffmpeg", cmd, input_path, output_path, check=True, stdin=subprocess.DEVNULL)
+
+def find_inputs(input_dir, output_dir, recursive=False):
+    """The .mkv files to plan, leaving out what this script writes itself:
+    the output folder (when it is inside the input folder), unfinished
+    *.partial-*.mkv files, the chunk folders of --chunked and earlier outputs
+    that would be converted onto themselves."""
+    files = input_dir.rglob("*.mkv") if recursive else input_dir.glob("*.mkv")
+    output_dir = output_dir.resolve()
+    inputs = []
+    for file in files:
+        resolved = file.resolve()
+        folders = file.relative_to(input_dir).parts[:-1]
+        if PARTIAL_RE.search(file.stem) or any(f.startswith(CHUNK_DIR_PREFIX) for f in folders):
+            continue
+        if output_dir != input_dir.resolve() and output_dir in resolved.parents:
+            continue
+        if (output_dir / f"{output_basename(file)}.mkv") == resolved:
+            print(f"Skipping {file} (it is its own output)")
+            continue
+        inputs.append(file)
+    return inputs
+
+def write_atomically(output_path, produce):
+    """Call produce(partial_path) and rename the result to output_path only
+    once it succeeds, so a killed run never leaves a truncated file under the
+    final name. The partial name is unique to this process and thread, so two
+    workers that got the same queued file never write into one file."""
+    partial_path = job_queue.partial_path(output_path)
+    try:
+        produce(partial_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    os.replace(partial_path, output_path)
+
+def process_file(file, output_dir, journal, board, subs_pool, threads=None, languages=DEFAULT_SUB_LANGS,
+                 action="transcode", info=None, chunking=None):
+    """Transcode (or remux) one file while its subtitles are extracted on
+    subs_pool, recording progress in the journal and skipping parts already done.
+    With `chunking` (chunk_seconds, chunk_jobs) the transcode is split into
+    keyframe-aligned chunks encoded in parallel."""
+    basename = output_basename(file)
+    output_video_path = output_dir / f"{basename}.mkv"
+    entry = journal.get(file)
+    video_done = entry.get("video") and output_video_path.exists()
+
+    journal.update(file, state="transcoding", output=str(output_video_path), error=None)
+    subs = None
+    if not entry.get("subs"):
+        subs = subs_pool.submit(extract_and_rename_subtitles, file, basename, output_dir, languages,
+                                info["streams"] if info else None)
+    video_error = None
+    try:
+        if not video_done:
+            on_progress = lambda percent: board.update(file, percent)
+            if action == "remux":
+                write_atomically(output_video_path, lambda path: remux_video(file, path, info))
+            elif chunking:
+                write_atomically(output_video_path, lambda path: convert_video_chunked(
+                    file, path, info, convert_video, threads, on_progress, *chunking))
+            else:
+                write_atomically(output_video_path, lambda path: convert_video(file, path, threads, on_progress))
+            journal.update(file, video=True)
+        journal.update(file, state="subs")
+    except BaseException as e:
+        video_error = e
+
+    # Always wait for the subtitle job so errors from both get reported
+    subs_error = subs.exception() if subs else None
+    if subs and not subs_error:
+        failed = [idx for idx, path in subs.result().items() if path is None]
+        if failed:
+            # Leave subs unset so --resume extracts them again
+            subs_error = RuntimeError(f"subtitle streams {', '.join(map(str, failed))} failed")
+        else:
+            journal.update(file, subs=True)
+
+    error = video_error or subs_error
+    if error:
+        journal.update(file, state="failed", error=str(error))
+        raise error
+    journal.update(file, state="done")
+    board.finish(file)
+
+def run_queued_file(payload, capacity):
+    """Job handler for `worker`: one file of a batch submitted with --queue.
+    A retry skips the video if an earlier attempt already finished it."""
+    file = Path(payload["file"])
+    output_dir = Path(payload["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    basename = output_basename(file)
+    output_video_path = output_dir / f"{basename}.mkv"
+    info = payload["info"]
+
+    if not output_video_path.exists():
+        if payload["action"] == "remux":
+            write_atomically(output_video_path, lambda path: remux_video(file, path, info))
+        else:
+            # Several slots on one host share its cores, like --jobs does
+            threads = payload["threads"] or (capacity["cores"] if capacity.get("slots", 1) > 1 else None)
+            write_atomically(output_video_path, lambda path: convert_video(file, path, threads))
+    subs = extract_and_rename_subtitles(file, basename, output_dir, tuple(payload["languages"]), info["streams"])
+    failed = [idx for idx, path in subs.items() if path is None]
+    if failed:
+        raise RuntimeError(f"subtitle streams {', '.join(map(str, failed))} failed")
+
+def submit_batch(queue_target, selected, output_dir, threads, languages):
+    """Queue one job per planned file instead of converting here. Longest
+    files get the highest priority so they start first."""
+    queue = job_queue.open_queue(queue_target)
+    for file, action, info in selected:
+        payload = {"file": str(file.resolve()), "output_dir": str(output_dir.resolve()), "action": action,
+                   "info": info, "threads": threads, "languages": list(languages)}
+        requires = {"ffmpeg": True, "handbrake": action == "transcode"}
+        priority = int(estimate_seconds(action, info, file.stat().st_size))
+        job_id = queue.submit(kind="video.process", payload=payload, requires=requires, priority=priority)
+        print(f"  queued #{job_id} {action:9} {file.name}")
+    print(f"Queued {len(selected)} file(s) in {queue_target}; start workers with: "
+          f"{Path(sys.argv[0]).name} worker {queue_target}")
 
 def main():
+    # `benchmark` subcommand: measure presets/threads on synthetic clips instead of converting
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        import encode_benchmark
+        encode_benchmark.main(sys.argv[2:])
+        return
+    # `worker` subcommand: run files submitted with --queue, possibly from another host
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        job_queue.worker_main(sys.argv[2:], {"video.process": run_queued_file},
+                              "Convert videos from a shared job queue.")
+        return
+
     parser = argparse.ArgumentParser(description="Batch convert & extract subtitles")
     parser.add_argument("input_dir", help="Input folder containing MKV files")
     parser.add_argument("output_dir", help="Output folder to save converted files & subtitles")
     parser.add_argument("--recursive", action="store_true", help="Recursively search subdirectories")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of HandBrake transcodes to run at the same time (default: 1)")
+    parser.add_argument("--threads", type=int,
+                        help="Encoder threads per transcode (default: all cores / --jobs)")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Split each transcode at keyframes and encode the chunks in parallel")
+    parser.add_argument("--chunk-seconds", type=int, default=CHUNK_SECONDS,
+                        help=f"Target chunk length for --chunked (default: {CHUNK_SECONDS})")
+    parser.add_argument("--chunk-jobs", type=int, default=CHUNK_JOBS,
+                        help=f"Chunks encoded at the same time per file with --chunked (default: {CHUNK_JOBS})")
+    parser.add_argument("--sub-langs", default=",".join(DEFAULT_SUB_LANGS),
+                        help="Comma-separated subtitle languages to extract, 'und' for untagged (default: eng,vie)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the previous batch: skip finished files and finish partial ones")
+    parser.add_argument("--probe-jobs", type=int, default=CPU_COUNT,
+                        help=f"Number of ffprobe runs in parallel (default: {CPU_COUNT})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only probe and print the plan, do not convert anything")
+    parser.add_argument("--queue",
+                        help="Submit the planned files to this job queue (database file or coordinator URL) "
+                             "instead of converting them here; see the worker subcommand")
+    parser.add_argument("--events", type=Path,
+                        help="Append a JSON line per timed step (ffprobe, HandBrake, ffmpeg) to this file")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print per-stage totals and the slowest steps at the end")
     args = parser.parse_args()
+    instrumentation.configure(args.events, args.timings)
 
     input_dir = Path(args.input_dir)
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = max(1, args.jobs)
+    languages = tuple(lang.strip() for lang in args.sub_langs.split(",") if lang.strip())
+    chunking = (args.chunk_seconds, max(1, args.chunk_jobs)) if args.chunked else None
+    encodes = jobs * (chunking[1] if chunking else 1)
+    threads = args.threads or (max(1, CPU_COUNT // encodes) if encodes > 1 else None)
 
-    # Chọn glob hoặc rglob dựa vào --recursive
-    if args.recursive:
-        files = list(input_dir.rglob("*.mkv"))
-    else:
-        files = list(input_dir.glob("*.mkv"))
+    files = find_inputs(input_dir, output_dir, args.recursive)
 
     print(f"Found {len(files)} mkv files in {input_dir} (recursive={args.recursive})")
 
-    for file in tqdm(files, desc="Processing files"):
-        if "264" not in file.name:
-            print(f"Skipping {file} (does not contain '264')")
+    probes = ProbeIndex(output_dir / PROBE_INDEX_NAME).probe_all(files, args.probe_jobs)
+    journal = JobJournal(output_dir / JOURNAL_NAME, resume=args.resume)
+    selected = []
+    counts = {"transcode": 0, "remux": 0}
+    estimate = 0.0
+    for file in files:
+        info = probes.get(file)
+        action = plan_action(info)
+        if action == "skip":
+            print(f"Skipping {file} (no video stream or probe failed)")
             continue
+        entry = journal.get(file)
+        if entry.get("state") == "done" and entry.get("output") and Path(entry["output"]).exists():
+            print(f"Skipping {file} (already done)")
+            continue
+        selected.append((file, action, info))
+        counts[action] += 1
+        estimate += estimate_seconds(action, info, file.stat().st_size)
+        if not entry and not args.dry_run and not args.queue:
+            journal.update(file, state="queued")
 
-        year = find_year(file.stem)
-        if year:
-            basename = file.stem.split(year, 1)[0] + year
-        else:
-            basename = file.stem
-
-        output_video_name = f"{basename}.720p.BluRay.AAC2.0.x265-NR.mkv"
-        output_video_path = output_dir / output_video_name
-
+    hours, rem = divmod(int(estimate / jobs), 3600)
+    print(f"Plan: {counts['transcode']} transcode, {counts['remux']} remux-only; "
+          f"estimated time ~{hours}h{rem // 60:02d}m with {jobs} job(s)")
+    if args.dry_run:
+        for file, action, info in selected:
+            print(f"  {action:9} {file.name} ({info['video_codec']} {info['width']}x{info['height']}, "
+                  f"{info['duration'] / 60:.0f} min)")
+        instrumentation.summary()
+        return
+    if args.queue:
         try:
-            convert_video(file, output_video_path)
-            extract_and_rename_subtitles(file, f"{basename}.720p.BluRay.AAC2.0.x265-NR", output_dir)
-        except subprocess.CalledProcessError as e:
-            print(f"Error processing {file}: {e}")
-            continue
+            submit_batch(args.queue, selected, output_dir, args.threads, languages)
+        except job_queue.QUEUE_ERRORS as e:
+            print(f"Queue unavailable: {e}")
+            sys.exit(1)
+        instrumentation.summary()
+        return
+
+    print(f"Running {jobs} transcode(s) at a time, threads per job: {threads or 'auto'}")
+    board = ProgressBoard(len(selected), input_dir)
+    with ThreadPoolExecutor(max_workers=jobs) as pool, \
+            ThreadPoolExecutor(max_workers=jobs) as subs_pool:
+        futures = {pool.submit(process_file, file, output_dir, journal, board, subs_pool, threads, languages,
+                               action, info, chunking): file
+                   for file, action, info in selected}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                # Any failure only costs this file; process_file journals the
+                # ones it sees, this also covers errors outside its try block
+                tqdm.write(f"Error processing {file}: {e}")
+                journal.update(file, state="failed", error=str(e))
+                board.fail(file)
+    board.close()
 
     print("All done!")
+    instrumentation.summary()
 
 if __name__ == "__main__":
     main()
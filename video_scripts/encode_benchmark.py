@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+CPU_COUNT = os.cpu_count() or 1
+SAMPLE_RATE = 24
+SAMPLE_SOURCES = {
+    # Synthetic clips from ffmpeg's lavfi sources, so no real media is needed
+    "testsrc2": "testsrc2=size=1920x1080:rate={rate}",
+    "mandelbrot": "mandelbrot=size=1920x1080:rate={rate}",
+    "noise": "color=c=gray:size=1920x1080:rate={rate},noise=alls=40:allf=t",
+}
+SSIM_RE = re.compile(r"SSIM .*All:([\d.]+)")
+PSNR_RE = re.compile(r"PSNR .*average:([\d.]+|inf)")
+
+
+def generate_sample(name, duration, work_dir):
+    """Render a lossless-ish H.264 reference clip from a lavfi source."""
+    path = work_dir / f"sample_{name}_{duration}s.mkv"
+    if path.exists():
+        return path
+    source = SAMPLE_SOURCES[name].format(rate=SAMPLE_RATE)
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", source,
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(duration),
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "12", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-ac", "2",
+        str(path)
+    ]
+    print(f"Generating sample clip: {path.name}")
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+    return path
+
+
+def measure_quality(encoded, reference):
+    """SSIM and PSNR of `encoded` against `reference` scaled to its size."""
+    lavfi = ("[1:v][0:v]scale2ref[ref][dist];"
+             "[dist]split[d1][d2];[ref]split[r1][r2];"
+             "[d1][r1]ssim;[d2][r2]psnr")
+    cmd = ["ffmpeg", "-v", "info", "-nostats", "-i", str(encoded), "-i", str(reference),
+           "-lavfi", lavfi, "-f", "null", "-"]
+    result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    ssim = SSIM_RE.search(result.stderr)
+    psnr = PSNR_RE.search(result.stderr)
+    return (float(ssim.group(1)) if ssim else None,
+            float(psnr.group(1)) if psnr else None)
+
+
+def run_case(sample, duration, preset, encoder_preset, threads, work_dir):
+    tag = re.sub(r"[^A-Za-z0-9]+", "_", f"{sample.stem}_{preset}_{encoder_preset}_{threads}")
+    output = work_dir / f"{tag}.mkv"
+    cmd = ["HandBrakeCLI", f"--preset={preset}", "-i", str(sample), "-o", str(output)]
+    if encoder_preset:
+        cmd += ["--encoder-preset", encoder_preset]
+    if threads:
+        cmd += ["--encopts", f"pools={threads}"]
+
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+    case = {
+        "sample": sample.name,
+        "preset": preset,
+        "encoder_preset": encoder_preset,
+        "threads": threads,
+        "exit_code": result.returncode,
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "fps": None,
+    }
+    if result.returncode == 0 and output.exists():
+        # A failed encode exits early, so its speed would look too good
+        case["fps"] = round(duration * SAMPLE_RATE / wall, 2) if wall else None
+        ssim, psnr = measure_quality(output, sample)
+        case.update({
+            "output_bytes": output.stat().st_size,
+            "ssim": ssim,
+            "psnr": psnr,
+        })
+        output.unlink()
+    return case
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="convert_and_extract_batch.py benchmark",
+        description="Benchmark HandBrake presets on generated sample clips")
+    parser.add_argument("--work-dir", default="benchmark_work", help="Folder for sample and encoded clips")
+    parser.add_argument("--report", default="benchmark_report.json", help="JSON report path")
+    parser.add_argument("--duration", type=int, default=10, help="Sample clip length in seconds (default: 10)")
+    parser.add_argument("--samples", default=",".join(SAMPLE_SOURCES),
+                        help=f"Comma-separated sample sources (default: {','.join(SAMPLE_SOURCES)})")
+    parser.add_argument("--presets", default="H.265 MKV 720p30",
+                        help="Comma-separated HandBrake presets (default: 'H.265 MKV 720p30')")
+    parser.add_argument("--encoder-presets", default="",
+                        help="Comma-separated x265 speed presets, e.g. 'fast,medium,slow' (default: preset's own)")
+    parser.add_argument("--threads", default="",
+                        help=f"Comma-separated thread counts, e.g. '4,8,{CPU_COUNT}' (default: HandBrake decides)")
+    args = parser.parse_args(argv)
+
+    def split_list(value, cast=str):
+        return [cast(v.strip()) for v in value.split(",") if v.strip()] or [None]
+
+    samples = split_list(args.samples)
+    unknown = [s for s in samples if s not in SAMPLE_SOURCES]
+    if unknown:
+        parser.error(f"Unknown sample source(s): {', '.join(unknown)}")
+
+    work_dir = Path(args.work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    clips = [generate_sample(name, args.duration, work_dir) for name in samples]
+
+    matrix = list(itertools.product(clips, split_list(args.presets), split_list(args.encoder_presets),
+                                    split_list(args.threads, int)))
+    results = []
+    for i, (clip, preset, encoder_preset, threads) in enumerate(matrix, 1):
+        print(f"[{i}/{len(matrix)}] {clip.name} | {preset} | {encoder_preset or 'default'} | "
+              f"threads={threads or 'auto'}")
+        case = run_case(clip, args.duration, preset, encoder_preset, threads, work_dir)
+        results.append(case)
+        print(f"  {case['wall_seconds']}s wall, {case['cpu_seconds']}s cpu, {case['fps']} fps, "
+              f"{case.get('output_bytes', '-')} bytes, SSIM {case.get('ssim')}, PSNR {case.get('psnr')}")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": {
+            "hostname": platform.node(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": CPU_COUNT,
+        },
+        "duration_seconds": args.duration,
+        "results": results,
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
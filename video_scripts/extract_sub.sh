@@ -1,12 +1,14 @@
 #!/bin/bash
 
-# Usage: ./extract_lang_subs.sh "input.mkv"
+# Usage: ./extract_lang_subs.sh "input.mkv" [languages]
+#   languages: comma-separated list, default "eng,vie"
 
 INPUT="$1"
 if [ -z "$INPUT" ]; then
-  echo "Usage: $0 <input.mkv>"
+  echo "Usage: $0 <input.mkv> [languages (default: eng,vie)]"
   exit 1
 fi
+LANGS=",${2:-eng,vie},"
 
 # Function: Map codec to extension
 get_extension() {
@@ -21,6 +23,10 @@ get_extension() {
   esac
 }
 
+MAP_ARGS=()
+STREAMS=()
+OUTFILES=()
+
 # FIXED: Use file descriptor 3 to avoid stdin interference
 exec 3< <(ffprobe -v error -select_streams s \
   -show_entries stream=index,codec_name:stream_tags=language \
@@ -35,23 +41,17 @@ while IFS=',' read -r IDX CODEC LANG <&3; do
     echo "  -> No language tag found, assuming English"
   fi
 
-  # Only extract if language is eng or vie
-  if [[ "$LANG" == "eng" || "$LANG" == "vie" ]]; then
+  # Only extract wanted languages; all of them go out in one ffmpeg pass below
+  if [[ "$LANGS" == *",$LANG,"* ]]; then
     EXT=$(get_extension "$CODEC")
     # Get base filename without extension
     BASENAME=$(basename "$INPUT" .mkv)
     OUTFILE="${BASENAME}.${IDX}.${LANG}.${EXT}"
 
-    echo "  -> Extracting stream 0:$IDX ($LANG, $CODEC) -> $OUTFILE"
-    # Use </dev/null to prevent ffmpeg from reading stdin
-    ffmpeg -v quiet -i "$INPUT" -map "0:$IDX" -c copy "$OUTFILE" </dev/null
-    
-    if [ $? -eq 0 ]; then
-      SIZE=$(stat -f%z "$OUTFILE" 2>/dev/null || stat -c%s "$OUTFILE" 2>/dev/null)
-      echo "  ✅ SUCCESS: $SIZE bytes"
-    else
-      echo "  ❌ FAILED"
-    fi
+    echo "  -> Queueing stream 0:$IDX ($LANG, $CODEC) -> $OUTFILE"
+    MAP_ARGS+=(-map "0:$IDX" -c copy "$OUTFILE")
+    STREAMS+=("$IDX")
+    OUTFILES+=("$OUTFILE")
   else
     echo "  -> Skipping: language '$LANG' not in target list"
   fi
@@ -60,4 +60,29 @@ done
 
 exec 3<&-  # Close file descriptor 3
 
+if [ "${#OUTFILES[@]}" -gt 0 ]; then
+  echo "Extracting ${#OUTFILES[@]} stream(s) in a single pass..."
+  # Use </dev/null to prevent ffmpeg from reading stdin
+  if ! ffmpeg -y -v quiet -i "$INPUT" "${MAP_ARGS[@]}" </dev/null; then
+    # One bad stream fails the whole pass and leaves the others incomplete,
+    # so start over with one pass per stream
+    echo "  Single pass failed, extracting streams one by one..."
+    rm -f "${OUTFILES[@]}"
+    for i in "${!OUTFILES[@]}"; do
+      ffmpeg -y -v quiet -i "$INPUT" -map "0:${STREAMS[$i]}" -c copy "${OUTFILES[$i]}" </dev/null \
+        || rm -f "${OUTFILES[$i]}"
+    done
+  fi
+
+  for OUTFILE in "${OUTFILES[@]}"; do
+    if [ -s "$OUTFILE" ]; then
+      SIZE=$(stat -f%z "$OUTFILE" 2>/dev/null || stat -c%s "$OUTFILE" 2>/dev/null)
+      echo "  ✅ SUCCESS: $OUTFILE ($SIZE bytes)"
+    else
+      echo "  ❌ FAILED: $OUTFILE"
+      rm -f "$OUTFILE"
+    fi
+  done
+fi
+
 echo "Extraction complete!"
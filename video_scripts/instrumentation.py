@@ -0,0 +1 @@
+../audio_scripts/instrumentation.py
\ No newline at end of file
@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+JOURNAL_NAME = ".batch_journal.json"
+STATES = ("queued", "transcoding", "subs", "done", "failed")
+
+
+class JobJournal:
+    """Per-file job state for a batch, saved atomically after every change.
+
+    Each entry is keyed by the input path and holds the current state plus
+    `video` / `subs` flags recording which outputs are already complete, so a
+    resumed run only redoes the missing part.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+        if resume and path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.jobs = json.load(f).get("jobs", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable journal {path}: {e}")
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.jobs.get(str(key), {}))
+
+    def update(self, key, **fields):
+        state = fields.get("state")
+        if state is not None and state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        with self.lock:
+            entry = self.jobs.setdefault(str(key), {})
+            entry.update(fields)
+            entry["updated"] = datetime.now().isoformat(timespec="seconds")
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"jobs": self.jobs}, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
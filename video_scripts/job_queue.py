@@ -0,0 +1 @@
+../audio_scripts/job_queue.py
\ No newline at end of file
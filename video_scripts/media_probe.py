@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+
+PROBE_INDEX_NAME = ".probe_index.json"
+TARGET_CODEC = "hevc"
+TARGET_HEIGHT = 720
+
+# Rough throughput used for the up-front time estimate only
+TRANSCODE_SPEED = 1.5  # seconds of video encoded per wall-clock second
+REMUX_BYTES_PER_SEC = 150e6
+
+
+def probe_file(path):
+    """Run ffprobe once and keep what the planner needs."""
+    cmd = [
+        "ffprobe", "-v", "error", "-show_format", "-show_streams",
+        "-of", "json", str(path)
+    ]
+    result = instrumentation.run("ffprobe", cmd, path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 check=True, text=True)
+    data = json.loads(result.stdout or "{}")
+    fmt = data.get("format", {})
+
+    streams = []
+    for stream in data.get("streams", []):
+        streams.append({
+            "index": stream.get("index"),
+            "type": stream.get("codec_type"),
+            "codec": stream.get("codec_name"),
+            "language": stream.get("tags", {}).get("language", ""),
+            "channels": stream.get("channels"),
+            "width": stream.get("width"),
+            "height": stream.get("height"),
+        })
+
+    video = next((s for s in streams if s["type"] == "video"), None)
+    return {
+        "video_codec": video["codec"] if video else None,
+        "width": video["width"] if video else None,
+        "height": video["height"] if video else None,
+        "duration": float(fmt.get("duration") or 0),
+        "bit_rate": int(fmt.get("bit_rate") or 0),
+        "streams": streams,
+    }
+
+
+class ProbeIndex:
+    """ffprobe results cached on disk, keyed by path and invalidated when the
+    file's size or mtime changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable probe index {path}: {e}")
+
+    def _lookup(self, file):
+        st = file.stat()
+        entry = self.entries.get(str(file.resolve()))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["info"]
+        return None
+
+    def _probe(self, file):
+        st = file.stat()
+        info = probe_file(file)
+        with self.lock:
+            self.entries[str(file.resolve())] = {
+                "size": st.st_size, "mtime_ns": st.st_mtime_ns, "info": info
+            }
+        return info
+
+    def probe_all(self, files, max_workers):
+        """Return {file: info or None}, probing uncached files in parallel."""
+        results = {}
+        missing = []
+        for file in files:
+            info = self._lookup(file)
+            if info is None:
+                missing.append(file)
+            else:
+                results[file] = info
+
+        if missing:
+            print(f"Probing {len(missing)} files ({len(results)} cached)")
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                futures = {pool.submit(self._probe, file): file for file in missing}
+                for future, file in futures.items():
+                    try:
+                        results[file] = future.result()
+                    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                        print(f"Probe failed for {file}: {e}")
+                        results[file] = None
+            self.save()
+        return results
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+def plan_action(info):
+    """Decide "transcode", "remux" or "skip" for one probed file."""
+    if not info or not info["video_codec"]:
+        return "skip"
+    if info["video_codec"] == TARGET_CODEC and (info["height"] or 0) <= TARGET_HEIGHT:
+        return "remux"
+    return "transcode"
+
+
+def stereo_audio_args(info, input_index=0):
+    """ffmpeg output options that bring the first audio track of input
+    `input_index` to stereo AAC like the HandBrake preset does (copied if it
+    already is)."""
+    audio = next((s for s in info["streams"] if s["type"] == "audio"), None)
+    if not audio:
+        return []
+    args = ["-map", f"{input_index}:{audio['index']}"]
+    if audio["codec"] == "aac" and (audio["channels"] or 2) <= 2:
+        return args + ["-c:a", "copy"]
+    return args + ["-c:a", "aac", "-ac", "2", "-b:a", "160k"]
+
+
+def estimate_seconds(action, info, file_size):
+    if action == "transcode":
+        return info["duration"] / TRANSCODE_SPEED
+    if action == "remux":
+        return file_size / REMUX_BYTES_PER_SEC
+    return 0.0